@@ -0,0 +1,98 @@
+"""
+Admission control for rendering dynamic responses.
+
+Limits the number of API responses rendered concurrently in the process,
+overall (`DYNAMICRESPONSE_CONCURRENCY_LIMIT`) or for specific views
+(`DYNAMICRESPONSE_VIEW_CONCURRENCY_LIMITS`, keyed by the dotted path of
+the view function). Requests wait up to `DYNAMICRESPONSE_CONCURRENCY_TIMEOUT`
+seconds for their turn, and are then rejected.
+"""
+
+import threading
+import time
+
+class Limiter(object):
+    """
+    A semaphore keeping track of the requests holding and waiting for it.
+    """
+
+    def __init__(self, limit):
+
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def acquire(self, timeout):
+        """
+        Waits up to `timeout` seconds for a slot. Returns whether it was acquired.
+        """
+
+        deadline = time.time() + timeout
+
+        self._condition.acquire()
+        try:
+            if self.active >= self.limit:
+                self.waiting += 1
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            self.active += 1
+            return True
+        finally:
+            self._condition.release()
+
+    def release(self):
+
+        self._condition.acquire()
+        try:
+            self.active -= 1
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def stats(self):
+
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+        }
+
+_limiters = {}
+_lock = threading.Lock()
+
+def get_limiter(key, limit):
+    """
+    Returns the limiter for the key, creating it when the limit changes.
+    """
+
+    limiter = _limiters.get(key)
+    if limiter is None or limiter.limit != limit:
+        _lock.acquire()
+        try:
+            limiter = _limiters.get(key)
+            if limiter is None or limiter.limit != limit:
+                limiter = _limiters[key] = Limiter(limit)
+        finally:
+            _lock.release()
+
+    return limiter
+
+def stats():
+    """
+    Returns the limit, active and waiting (queued) requests, and number
+    of rejected requests for each limiter, keyed by view (or `None` for
+    the overall limit).
+    """
+
+    return dict((key, limiter.stats()) for key, limiter in _limiters.items())
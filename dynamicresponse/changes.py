@@ -0,0 +1,130 @@
+"""
+Change feeds for incremental synchronization.
+
+Models are tracked to record deletions as tombstones:
+
+    from dynamicresponse import changes
+
+    changes.track(BlogPost)
+
+A view then returns the objects changed since the client's last sync,
+using a column that increases with every change (such as a revision
+number, or a modification time set with `auto_now=True`):
+
+    def sync_posts(request):
+        return SerializeChanges(BlogPost.objects.all(), 'modified')
+
+Tracking requires `dynamicresponse` in `INSTALLED_APPS`. Deletions of
+untracked models are not returned.
+"""
+
+import base64
+
+from django.db.models import Max
+from django.db.models.signals import post_delete
+from django.utils import simplejson
+from django.utils.encoding import smart_unicode
+
+from dynamicresponse.models import Tombstone
+
+class InvalidToken(ValueError):
+    """
+    Raised for tokens that were not issued by `changes_since`.
+    """
+    pass
+
+# Models recording tombstones
+_tracked = set()
+
+def _label(model):
+
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+
+def _record_deletion(sender, instance, **kwargs):
+
+    Tombstone.objects.create(model=_label(sender), object_id=smart_unicode(instance.pk))
+
+def track(model):
+    """
+    Records a tombstone whenever an object of the model is deleted.
+    """
+
+    post_delete.connect(_record_deletion, sender=model, dispatch_uid='dynamicresponse.changes.%s' % _label(model))
+    _tracked.add(model)
+
+def untrack(model):
+    """
+    Stops recording tombstones for the model.
+    """
+
+    post_delete.disconnect(sender=model, dispatch_uid='dynamicresponse.changes.%s' % _label(model))
+    _tracked.discard(model)
+
+def encode_token(value, tombstone):
+    """
+    Encodes the last seen change column value and tombstone as a token.
+    """
+
+    if value is not None:
+        value = smart_unicode(value)
+
+    return base64.urlsafe_b64encode(simplejson.dumps([value, tombstone]))
+
+def decode_token(token, field):
+    """
+    Decodes a token into the last seen change column value (converted
+    for `field`) and tombstone.
+    """
+
+    try:
+        value, tombstone = simplejson.loads(base64.urlsafe_b64decode(str(token)))
+        if value is not None:
+            value = field.to_python(value)
+        return value, int(tombstone)
+    except Exception:
+        raise InvalidToken('Invalid change token')
+
+def changes_since(queryset, column, token=None):
+    """
+    Returns the objects in the queryset changed since the token was
+    issued, ordered by `column`, the primary keys of objects deleted
+    since then, and the token for the next request.
+
+    Without a token, all objects are returned, and no deletions. No
+    deletions are returned for untracked models either (see `track`.)
+    """
+
+    model = queryset.model
+    field = model._meta.get_field(column)
+
+    # Bound the changes by the current maximums, so that changes made
+    # while the response is serialized are returned by the next request
+    latest = queryset.aggregate(latest=Max(column))['latest']
+    tracked = model in _tracked
+    last_tombstone = 0
+    if tracked:
+        tombstones = Tombstone.objects.filter(model=_label(model))
+        last_tombstone = tombstones.aggregate(last=Max('id'))['last'] or 0
+
+    changed = queryset.order_by(column)
+    deleted = []
+
+    if token:
+        since, since_tombstone = decode_token(token, field)
+        if since is not None:
+            changed = changed.filter(**{ '%s__gt' % column: since })
+
+        if tracked:
+            ids = tombstones.filter(id__gt=since_tombstone, id__lte=last_tombstone).values_list('object_id', flat=True)
+            deleted = [model._meta.pk.to_python(pk) for pk in ids]
+
+    else:
+        since = None
+
+    if latest is None:
+        changed = changed.none()
+        latest = since
+    else:
+        changed = changed.filter(**{ '%s__lte' % column: latest })
+
+    return changed, deleted, encode_token(latest, last_tombstone)
@@ -0,0 +1,119 @@
+"""
+Generated serializer functions for models.
+
+For each model and set of serialized fields, a specialized function is
+generated and compiled, reading the model fields directly instead of
+interpreting the field set for every instance. Types that the emitter
+would return unchanged (numbers and strings) are stored without a call
+to the generic dispatch function.
+
+Enable by setting `DYNAMICRESPONSE_COMPILED_SERIALIZERS` to `True`, or to
+`'verify'` to also run the generic serialization and compare the results.
+"""
+
+import re
+
+_identifier = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Types passed through unchanged by `Emitter.construct`
+PLAIN_TYPES = frozenset([
+    int, long, bool, float, unicode, type(None),
+])
+
+_serializers = {}
+
+class SerializerMismatch(Exception):
+    """
+    Raised in verify mode when a generated serializer differs from the generic path.
+    """
+    pass
+
+def _read(name):
+    """
+    Returns the source for reading an attribute from `obj`.
+    """
+
+    if _identifier.match(name):
+        return 'obj.%s' % name
+
+    return 'getattr(obj, %r)' % name
+
+def generate(model, fields):
+    """
+    Generates a serializer function for the model fields among `fields`,
+    mirroring the field loops in `Emitter.serializer`. Returns the function
+    and the field names it consumed; other fields are left to the emitter.
+
+    The function is called as `serialize(obj, ret)`. Plain values are
+    stored in `ret`, and the `(key, thing, fields)` children that still
+    need to be serialized are returned.
+    """
+
+    from dynamicresponse.emitters import Related
+
+    lines = ['def serialize(obj, ret):', '    pending = []']
+    consumed = set()
+    related = []
+
+    for f in model._meta.local_fields:
+        if not f.rel:
+
+            # Fields that are not serialized as model fields (like primary keys)
+            # are picked up by name with the remainder of fields instead, but
+            # their values are never callable, so the result is the same.
+            if f.attname in fields:
+                lines.append('    v = %s' % _read(f.attname))
+                lines.append('    if v.__class__ in _plain:')
+                lines.append('        ret[%r] = v' % f.attname)
+                lines.append('    else:')
+                lines.append('        pending.append((%r, v, ()))' % f.attname)
+                consumed.add(f.attname)
+
+        elif f.serialize and f.attname[:-3] in fields:
+            lines.append('    pending.append((%r, _Related(obj, _rel_%s), ()))' % (f.name, len(related)))
+            related.append(f)
+            consumed.add(f.name)
+
+    for mf in model._meta.many_to_many:
+        if mf.serialize and mf.attname in fields:
+            lines.append('    pending.append((%r, %s.all(), ()))' % (mf.name, _read(mf.name)))
+            consumed.add(mf.name)
+
+    lines.append('    return pending')
+
+    source = '\n'.join(lines) + '\n'
+    namespace = { '_plain': PLAIN_TYPES, '_Related': Related }
+    for i, f in enumerate(related):
+        namespace['_rel_%s' % i] = f
+
+    exec compile(source, '<serializer for %s>' % model.__name__, 'exec') in namespace
+
+    serialize = namespace['serialize']
+    serialize.source = source
+    return serialize, frozenset(consumed)
+
+def get_serializer(model, fields):
+    """
+    Returns the cached `(serializer, consumed)` pair for the model and
+    field set, generating it on first use. Returns `None` when the
+    field set cannot be used as a cache key.
+    """
+
+    try:
+        key = (model, frozenset(fields))
+    except TypeError:
+        return None
+
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = generate(model, key[1])
+
+    return serializer
+
+def verify(model, generated, expected):
+    """
+    Compares the output of a generated serializer to the generic path.
+    """
+
+    if generated != expected:
+        raise SerializerMismatch('Generated serializer for %s returned %r, expected %r' % (model.__name__, generated, expected))
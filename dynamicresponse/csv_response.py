@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse
+
+from dynamicresponse import parallel
+from dynamicresponse.emitters import CSVEmitter
+
+class CSVResponse(HttpResponse):
+    """
+    Provides a CSV response to a client, streaming one line
+    per row as the payload is iterated.
+    """
+
+    def __init__(self, object=None, **kwargs):
+
+        # Stream the serialized lines as the response is consumed
+        if object is not None:
+            emitter = CSVEmitter(object, {}, None)
+            content = emitter.stream()
+
+            # Serialize querysets in worker processes when requested
+            processes = kwargs.get('parallel')
+            if processes:
+                content = parallel.stream(emitter, processes=None if processes is True else processes)
+        else:
+            content = ''
+
+        # Status code for the response
+        status_code = kwargs.get('status', 200)
+
+        # Return response with correct payload/type
+        super(CSVResponse, self).__init__(
+            content,
+            content_type='text/csv; charset=%s' % settings.DEFAULT_CHARSET,
+            status=status_code
+        )
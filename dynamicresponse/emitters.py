@@ -4,11 +4,12 @@ http://bitbucket.org/jespern/django-piston
 """
 
 from __future__ import generators
-from django.db.models.query import QuerySet
+from django.db.models.query import EmptyQuerySet, QuerySet
 from django.db.models import Model, permalink
+from django.db.models.manager import Manager
 from django.utils import simplejson
 from django.utils.xmlutils import SimplerXMLGenerator
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_unicode, smart_str
 from django.core.urlresolvers import reverse, NoReverseMatch
 from django.core.serializers.json import DateTimeAwareJSONEncoder
 from django.conf import settings
@@ -17,8 +18,111 @@ from django.http import HttpResponse
 from django.core import serializers
 from django.core.paginator import Page
 
-import decimal, re, inspect
+from dynamicresponse import codegen, fieldprofile, handlers, schema
+
+import base64, datetime, decimal, re, inspect, time, uuid
 import copy
+from itertools import chain
+import csv
+from cStringIO import StringIO
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Formatters for values the JSON encoder would convert in Python callbacks.
+# Applied while constructing, so the encoder only sees native JSON types.
+_encoder = DateTimeAwareJSONEncoder()
+FORMATTERS = {
+    datetime.datetime: _encoder.default,
+    datetime.date: _encoder.default,
+    datetime.time: _encoder.default,
+    decimal.Decimal: str,
+    uuid.UUID: unicode,
+}
+
+class RawJSON(object):
+    """
+    A pre-encoded JSON fragment, spliced verbatim into the JSON output.
+    The fragment is not validated.
+    """
+
+    def __init__(self, json):
+
+        self.json = smart_unicode(json)
+
+    def __unicode__(self):
+
+        return self.json
+
+    def __str__(self):
+
+        return smart_str(self.json)
+
+class RawJSONEncoder(DateTimeAwareJSONEncoder):
+    """
+    Encodes `RawJSON` fragments as placeholders, which are
+    replaced with the fragments by `dumps`.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        self.fragments = kwargs.pop('fragments')
+        self.placeholder = kwargs.pop('placeholder')
+        super(RawJSONEncoder, self).__init__(*args, **kwargs)
+
+    def default(self, o):
+
+        if isinstance(o, RawJSON):
+            self.fragments.append(o.json)
+            return self.placeholder % (len(self.fragments) - 1)
+
+        return super(RawJSONEncoder, self).default(o)
+
+def dumps(data, **kwargs):
+    """
+    Encodes the data as JSON, splicing in `RawJSON` fragments.
+    """
+
+    fragments = []
+    token = uuid.uuid4().hex
+    kwargs.setdefault('ensure_ascii', False)
+
+    seria = simplejson.dumps(data, cls=RawJSONEncoder, fragments=fragments, placeholder='rawjson-%s-%%d' % token, **kwargs)
+    if fragments:
+        seria = re.sub('"rawjson-%s-(\\d+)"' % token, lambda m: fragments[int(m.group(1))], seria)
+
+    return seria
+
+class Pending(object):
+    """
+    A container whose children are still to be serialized,
+    as `(key, thing, fields)` tuples (see `Emitter.serializer`).
+    """
+
+    def __init__(self, value, children, source):
+
+        self.value = value
+        self.children = children
+        self.source = source
+
+class Related(object):
+    """
+    An object referenced by a foreign key, loaded when serialized. The model
+    and primary key are known up front, so already serialized objects can be
+    reused without loading them again.
+    """
+
+    def __init__(self, instance, field):
+
+        self.instance = instance
+        self.field = field
+        self.model = field.rel.to
+
+        self.pk = None
+        if field.rel.field_name == self.model._meta.pk.name:
+            self.pk = getattr(instance, field.attname)
 
 class Emitter(object):
     """
@@ -30,229 +134,646 @@ class Emitter(object):
     """
 
     EMITTERS = {}
-    RESERVED_FIELDS = set([
-        'read',
-        'update',
-        'create',
-        'delete',
-        'model',
-        'anonymous',
-        'allowed_methods',
-        'fields',
-        'exclude'
-    ])
-
-    def __init__(self, payload, typemapper, handler, fields=(), anonymous=True):
+    RESERVED_FIELDS = set(handlers.RESERVED_FIELDS)
+
+    def __init__(self, payload, typemapper, handler, fields=(), anonymous=True, compact=False, columnar=False):
 
         self.typemapper = typemapper
+        self.typemapper_index = dict([ ((km, is_anon), klass) for klass, (km, is_anon) in (typemapper or {}).iteritems() ])
         self.data = payload
         self.handler = handler
         self.fields = fields
         self.anonymous = anonymous
+        self.compact = compact
+        self.columnar = columnar
 
         if isinstance(self.data, Exception):
             raise
 
-    def method_fields(self, handler, fields):
-
-        if not handler:
-            return {}
-
-        ret = dict()
-        for field in fields - Emitter.RESERVED_FIELDS:
-            t = getattr(handler, str(field), None)
-
-            if t and callable(t):
-                ret[field] = t
-
-        return ret
-
     def construct(self):
         """
         Recursively serialize a lot of types, and
         in cases where it doesn't recognize the type,
         it will fall back to Django's `smart_unicode`.
 
-        Returns `dict`.
+        Returns `dict`. In compact mode, returns a `dict` with the
+        payload in `data`, and objects occurring more than once in
+        `objects`, keyed by the references used in the payload.
         """
 
-        def _any(thing, fields=()):
-            """
-            Dispatch, all types are routed through here.
+        # Kickstart the seralizin'.
+        serialize = self.serializer()
+        if self.compact:
+            objects = { }
+            data = serialize(self.data, self.fields, objects)
+            return { 'data': data, 'objects': objects }
+
+        return serialize(self.data, self.fields)
+
+    def serializer(self):
+        """
+        Builds the serialization functions used by `construct`,
+        returning the entry point. Emitters that serialize the
+        payload piece by piece can reuse it for every item.
+
+        Nested structures are walked with an explicit stack rather
+        than recursion. Containers are created empty and filled as
+        their children are serialized, depth first, so the output
+        is the same as a recursive walk. Reference cycles and
+        structures nested deeper than `DYNAMICRESPONSE_MAX_DEPTH`
+        raise `ValueError`.
+        """
+
+        compiled_serializers = getattr(settings, 'DYNAMICRESPONSE_COMPILED_SERIALIZERS', False)
+        max_depth = getattr(settings, 'DYNAMICRESPONSE_MAX_DEPTH', 100)
+        identity_map = getattr(settings, 'DYNAMICRESPONSE_IDENTITY_MAP', True)
+        base64_threshold = getattr(settings, 'DYNAMICRESPONSE_NUMPY_BASE64_THRESHOLD', None)
+        field_profile = fieldprofile.active()
+
+        # Generated serializers read the fields before they can be timed
+        if field_profile is not None:
+            compiled_serializers = False
+
+        def _any(thing, fields=(), objects=None):
             """
+            Serializes a value of any type.
 
-            ret = None
+            Models are looked up in an identity map by model and primary
+            key, so each object is serialized once. When `objects` is given,
+            objects occurring more than once are moved to it, and replaced
+            by `{ "$ref": "app_label.model:pk" }` references.
+            """
 
-            if isinstance(thing, QuerySet):
-                ret = _qs(thing, fields=fields)
-            elif isinstance(thing, Page):
-                ret = _list(thing.object_list, fields=fields)
-            elif isinstance(thing, (tuple, list)):
-                ret = _list(thing, fields=fields)
-            elif isinstance(thing, dict):
-                ret = _dict(thing, fields=fields)
-            elif isinstance(thing, decimal.Decimal):
-                ret = str(thing)
-            elif isinstance(thing, Model):
-                ret = _model(thing, fields=fields)
-            elif inspect.isfunction(thing):
-                if not inspect.getargspec(thing)[0]:
-                    ret = _any(thing())
-            elif hasattr(thing, '__emittable__'):
-                f = thing.__emittable__
-                if inspect.ismethod(f) and len(inspect.getargspec(f)[0]) == 1:
-                    ret = _any(f())
-            elif repr(thing).startswith("<django.db.models.fields.related.RelatedManager"):
-                ret = _any(thing.all())
-            else:
-                ret = smart_unicode(thing, strings_only=True)
+            ret, children, source = _expand(thing, fields)
+            if children is None:
+                return ret
+
+            stack = [ (ret, iter(children), source, None) ]
+            active = set([ id(source) ])
+            seen = { }
+            first = { }
+
+            while stack:
+                container, children, source, memo = stack[-1]
+
+                try:
+                    key, thing, fields = next(children)
+                except StopIteration:
+                    stack.pop()
+                    active.discard(id(source))
+                    if memo is not None:
+                        seen[memo] = container
+                    continue
+
+                # Reuse objects that have already been serialized
+                memo = identity_map and _memo(thing, fields)
+                if memo and memo in seen:
+                    value = seen[memo]
+                    if objects is not None:
+                        value = _reference(memo, value, objects, first)
+                    grandchildren = None
+                else:
+                    value, grandchildren, source = _expand(thing, fields)
+
+                if key is None:
+                    container.append(value)
+                    key = len(container) - 1
+                else:
+                    container[key] = value
+
+                if grandchildren is not None:
+                    if id(source) in active:
+                        raise ValueError('Circular reference detected')
+                    if max_depth and len(stack) >= max_depth:
+                        raise ValueError('Maximum serialization depth of %d exceeded' % max_depth)
+
+                    stack.append((value, iter(grandchildren), source, memo or None))
+                    active.add(id(source))
+
+                    if memo:
+                        first[memo] = (container, key)
 
             return ret
 
-        def _fk(data, field):
+        def _memo(thing, fields):
             """
-            Foreign keys.
+            Returns the identity map key for models with a primary key.
             """
 
-            return _any(getattr(data, field.name))
+            if isinstance(thing, Related):
+                model, pk = thing.model, thing.pk
+            elif isinstance(thing, Model):
+                model, pk = thing.__class__, thing.pk
+            else:
+                return None
+
+            if pk is None:
+                return None
+
+            try:
+                return (model, pk, frozenset(fields))
+            except TypeError:
+                return None
 
-        def _related(data, fields=()):
+        def _reference(memo, value, objects, first):
             """
-            Foreign keys.
+            Moves a repeated object to `objects`, returning a reference to it.
+            The first occurrence of the object is replaced as well.
             """
 
-            return [ _model(m, fields) for m in data.iterator() ]
+            model, pk, fields = memo
+            label = '%s.%s:%s' % (model._meta.app_label, model._meta.object_name.lower(), pk)
 
-        def _m2m(data, field, fields=()):
+            if label not in objects:
+                objects[label] = value
+                container, key = first[memo]
+                container[key] = { '$ref': label }
+
+            # The same object serialized with other fields is kept in place
+            elif objects[label] is not value:
+                return value
+
+            return { '$ref': label }
+
+        def _expand(thing, fields=()):
             """
-            Many to many (re-route to `_model`.)
+            Dispatch, all types are routed through here.
+
+            Returns a `(value, children, source)` tuple. For containers,
+            `value` is still empty and `children` yields the `(key, thing,
+            fields)` to serialize into it (with `None` keys for lists).
+            `source` is the object the container was created from.
             """
 
-            return [ _model(m, fields) for m in getattr(data, field.name).iterator() ]
+            while True:
+
+                formatter = FORMATTERS.get(thing.__class__)
+                if formatter is not None:
+                    return formatter(thing), None, None
+
+                if isinstance(thing, Pending):
+                    return thing.value, thing.children, thing.source
+                elif isinstance(thing, RawJSON):
+                    return thing, None, None
+                elif numpy is not None and isinstance(thing, (numpy.ndarray, numpy.generic)):
+                    if isinstance(thing, numpy.generic):
+                        thing = thing.item()
+                    elif thing.dtype.kind not in 'biuf':
+                        thing = thing.tolist()
+                    else:
+                        return _ndarray(thing), None, None
+                elif isinstance(thing, Related):
+                    if field_profile is not None:
+                        thing = _profiled_related(thing)
+                    else:
+                        thing = getattr(thing.instance, thing.field.name)
+                elif self.columnar and _homogeneous(thing):
+                    return _columnar(thing, fields)
+                elif isinstance(thing, QuerySet):
+                    return [], _items(self.iterate_queryset(thing), fields), thing
+                elif isinstance(thing, Page):
+                    return [], _items(thing.object_list, fields), thing
+                elif isinstance(thing, (tuple, list)):
+                    return [], _items(thing, fields), thing
+                elif isinstance(thing, dict):
+                    return {}, _dict(thing, fields), thing
+                elif isinstance(thing, decimal.Decimal):
+                    return str(thing), None, None
+                elif isinstance(thing, Model):
+                    ret, children, source = _model(thing, fields=fields)
+                    if field_profile is not None and children is not None:
+                        children = _profiled(thing, children)
+                    return ret, children, source
+                elif inspect.isfunction(thing):
+                    if inspect.getargspec(thing)[0]:
+                        return None, None, None
+                    thing, fields = thing(), ()
+                elif hasattr(thing, '__emittable__'):
+                    f = thing.__emittable__
+                    if not (inspect.ismethod(f) and len(inspect.getargspec(f)[0]) == 1):
+                        return None, None, None
+                    thing, fields = f(), ()
+                elif isinstance(thing, Manager):
+                    thing, fields = thing.all(), ()
+                else:
+                    return smart_unicode(thing, strings_only=True), None, None
 
         def _model(data, fields=()):
             """
             Models. Will respect the `fields` and/or
-            `exclude` on the handler (see `typemapper`.)
+            `exclude` on the registered handler (see `dynamicresponse.handlers`.)
             """
 
             ret = { }
-            handler = None
+            met_fields = { }
+
+            # Is there a schema registered for the model?
+            compiled = schema.registry.get(data.__class__)
+            if compiled is not None:
+                return ret, _schema(data, compiled), data
+
+            # Is there a handler registered for the model?
+            # Its fields and resource methods are resolved at registration.
+            handler = handlers.registry.get(data.__class__)
+            if handler is not None:
+                fields = handler.fields
+                met_fields = handler.method_fields
 
             # Does the model implement get_serialization_fields() or serialize_fields()?
             # We should only serialize these fields.
-            if hasattr(data, 'get_serialization_fields'):
-                fields = set(data.get_serialization_fields())
-            if hasattr(data, 'serialize_fields'):
+            elif hasattr(data, 'serialize_fields'):
                 fields = set(data.serialize_fields())
+            elif hasattr(data, 'get_serialization_fields'):
+                fields = set(data.get_serialization_fields())
 
             # Is the model a Django user instance?
             # Ensure that only core (non-sensitive fields) are serialized
-            if isinstance(data, User):
+            if isinstance(data, User) and handler is None:
                 fields = getattr(settings, 'DYNAMICRESPONSE_DJANGO_USER_FIELDS', ('id', 'email', 'first_name', 'last_name'))
 
             # Should we explicitly serialize specific fields?
-            if fields:
+            if not fields:
+                return ret, _reflect(data), data
 
-                v = lambda f: getattr(data, f.attname)
+            get_fields = set(fields)
 
-                get_fields = set(fields)
-                met_fields = self.method_fields(handler, get_fields)
+            # Use a generated serializer for the model fields when enabled
+            serializer = None
+            if compiled_serializers and not met_fields:
+                serializer = codegen.get_serializer(data.__class__, get_fields)
 
-                # Serialize normal fields
-                for f in data._meta.local_fields:
-                    if f.serialize and not any([ p in met_fields for p in [ f.attname, f.name ]]):
-                        if not f.rel:
-                            if f.attname in get_fields:
-                                ret[f.attname] = _any(v(f))
-                                get_fields.remove(f.attname)
-                        else:
-                            if f.attname[:-3] in get_fields:
-                                ret[f.name] = _fk(data, f)
-                                get_fields.remove(f.name)
-
-                # Serialize many-to-many fields
-                for mf in data._meta.many_to_many:
-                    if mf.serialize and mf.attname not in met_fields:
-                        if mf.attname in get_fields:
-                            ret[mf.name] = _m2m(data, mf)
-                            get_fields.remove(mf.name)
-
-                # Try to get the remainder of fields
-                for maybe_field in get_fields:
-                    if isinstance(maybe_field, (list, tuple)):
-                        model, fields = maybe_field
-                        inst = getattr(data, model, None)
-
-                        if inst:
-                            if hasattr(inst, 'all'):
-                                ret[model] = _related(inst, fields)
-                            elif callable(inst):
-                                if len(inspect.getargspec(inst)[0]) == 1:
-                                    ret[model] = _any(inst(), fields)
-                            else:
-                                ret[model] = _model(inst, fields)
-
-                    elif maybe_field in met_fields:
-                        # Overriding normal field which has a "resource method"
-                        # so you can alter the contents of certain fields without
-                        # using different names.
-                        ret[maybe_field] = _any(met_fields[maybe_field](data))
+            if serializer is None:
+                return ret, _fields(data, get_fields, met_fields), data
+
+            serialize, consumed = serializer
+            children = chain(serialize(data, ret), _remainder(data, get_fields - consumed, met_fields))
+
+            # Compare with the generic path in verify mode
+            if compiled_serializers == 'verify':
+                ret = _any(Pending(ret, children, data))
+                codegen.verify(data.__class__, ret, _any(Pending({ }, _fields(data, get_fields, met_fields), data)))
+                return ret, None, None
+
+            return ret, children, data
+
+        def _profiled(data, children):
+            """
+            Records the cost of reading each field of a model, fetching
+            querysets up front so that their queries are attributed to the
+            field (see `dynamicresponse.fieldprofile`.) Related objects are
+            recorded when they are fetched (see `_profiled_related`.)
+            """
+
+            while True:
+                start, queries = time.time(), fieldprofile.query_count()
+                try:
+                    key, thing, fields = next(children)
+                except StopIteration:
+                    return
+
+                if isinstance(thing, QuerySet):
+                    thing = list(thing)
+
+                field_profile.record(data.__class__, key, time.time() - start, fieldprofile.query_count() - queries)
+                yield key, thing, fields
+
+        def _profiled_related(related):
+            """
+            Fetches a related object, attributing its cost to the field.
+            Objects found in the identity map are never fetched.
+            """
+
+            start, queries = time.time(), fieldprofile.query_count()
+            thing = getattr(related.instance, related.field.name)
+            field_profile.record(related.instance.__class__, related.field.name, time.time() - start, fieldprofile.query_count() - queries, reads=0)
+            return thing
+
+        def _fields(data, get_fields, met_fields):
+            """
+            Fields listed in `get_fields`, starting with the model fields.
+            """
 
+            # Serialize normal fields
+            for f in data._meta.local_fields:
+                if f.serialize and not any([ p in met_fields for p in [ f.attname, f.name ]]):
+                    if not f.rel:
+                        if f.attname in get_fields:
+                            yield f.attname, getattr(data, f.attname), ()
+                            get_fields.remove(f.attname)
                     else:
-                        maybe = getattr(data, maybe_field, None)
-                        if maybe:
-                            if callable(maybe):
-                                if len(inspect.getargspec(maybe)[0]) == 1:
-                                    ret[maybe_field] = _any(maybe())
-                            else:
-                                ret[maybe_field] = _any(maybe)
+                        if f.attname[:-3] in get_fields:
+                            yield f.name, Related(data, f), ()
+                            get_fields.remove(f.name)
+
+            # Serialize many-to-many fields
+            for mf in data._meta.many_to_many:
+                if mf.serialize and mf.attname not in met_fields:
+                    if mf.attname in get_fields:
+                        yield mf.name, getattr(data, mf.name).all(), ()
+                        get_fields.remove(mf.name)
+
+            for child in _remainder(data, get_fields, met_fields):
+                yield child
+
+        def _remainder(data, get_fields, met_fields):
+            """
+            Fields that are not model fields.
+            """
+
+            for maybe_field in get_fields:
+                if isinstance(maybe_field, (list, tuple)):
+                    model, fields = maybe_field
+                    inst = getattr(data, model, None)
+
+                    if inst:
+                        if hasattr(inst, 'all'):
+                            yield model, inst.all(), fields
+                        elif callable(inst):
+                            if len(inspect.getargspec(inst)[0]) == 1:
+                                yield model, inst(), fields
+                        else:
+                            yield model, inst, fields
+
+                elif maybe_field in met_fields:
+                    # Overriding normal field which has a "resource method"
+                    # so you can alter the contents of certain fields without
+                    # using different names.
+                    yield maybe_field, met_fields[maybe_field](data), ()
+
+                else:
+                    maybe = getattr(data, maybe_field, None)
+                    if maybe:
+                        if callable(maybe):
+                            if len(inspect.getargspec(maybe)[0]) == 1:
+                                yield maybe_field, maybe(), ()
                         else:
-                            ret[maybe_field] = _any(maybe)
+                            yield maybe_field, maybe, ()
+                    else:
+                        yield maybe_field, maybe, ()
+
+        def _reflect(data):
+            """
+            All fields not starting with an underscore, including
+            attributes added to the instance.
+            """
+
+            names = [ f.attname for f in data._meta.fields if not f.attname.startswith('_') ]
+            for name in names:
+                yield name, getattr(data, name), ()
+
+            fields = dir(data.__class__) + names
+            add_ons = [k for k in dir(data) if k not in fields]
+
+            for k in add_ons:
+                if not k.__str__().startswith('_'):
+                    yield k, getattr(data, k), ()
+
+        def _schema(data, compiled):
+            """
+            Models with a registered schema (see `dynamicresponse.schema`.)
+            """
+
+            for key, getter, nested in compiled.entries:
+                value = getter(data)
+
+                if nested is None or value is None:
+                    yield key, value, ()
+                elif isinstance(value, Model):
+                    yield key, Pending({ }, _schema(value, nested), value), ()
+                else:
+                    if isinstance(value, Manager):
+                        value = value.all()
+                    if isinstance(value, QuerySet):
+                        value = self.iterate_queryset(value)
+                    yield key, Pending([], _schema_list(value, nested), value), ()
+
+        def _schema_list(data, compiled):
+            """
+            Lists of models with a registered schema.
+            """
+
+            for v in data:
+                yield None, Pending({ }, _schema(v, compiled), v), ()
+
+        def _ndarray(data):
+            """
+            Numeric NumPy arrays, converted in one go. Arrays with at least
+            `DYNAMICRESPONSE_NUMPY_BASE64_THRESHOLD` elements are encoded as
+            base64 of the raw array data, along with its dtype and shape.
+            """
+
+            if base64_threshold is not None and data.size >= base64_threshold:
+                return {
+                    'dtype': data.dtype.str,
+                    'shape': list(data.shape),
+                    'data': base64.b64encode(numpy.ascontiguousarray(data).tostring()),
+                }
+
+            return data.tolist()
+
+        def _homogeneous(data):
+            """
+            Returns whether the data is a queryset or a list of models of the
+            same type, or a page of those. Empty lists are left as lists.
+            """
+
+            if isinstance(data, Page):
+                data = _page_objects(data)
+
+            if isinstance(data, QuerySet):
+                return True
+            elif isinstance(data, (tuple, list)) and data and isinstance(data[0], Model):
+                model = data[0].__class__
+                return all([ v.__class__ is model for v in data ])
+
+            return False
+
+        def _page_objects(page):
+            """
+            Returns the objects on a page. Empty pages of querysets are
+            returned as empty querysets, as paginators return them as lists.
+            """
+
+            data = page.object_list
+            if isinstance(data, (tuple, list)) and not data and isinstance(page.paginator.object_list, QuerySet):
+                return page.paginator.object_list.none()
+
+            return data
+
+        def _columnar(data, fields=()):
+            """
+            Homogeneous lists of models, as `{ "columns": [...], "rows": [[...], ...] }`.
+            Querysets are read with `values_list()` when all columns are plain model fields.
+            """
+
+            ret = { 'columns': [] }
+
+            if isinstance(data, Page):
+                data = _page_objects(data)
+
+            if isinstance(data, QuerySet):
+                columns = _value_columns(data, fields)
+                if columns is not None:
+                    ret['columns'] = columns
 
+                    # values_list() loses the emptiness of none() in older Django versions
+                    if isinstance(data, EmptyQuerySet):
+                        rows = iter(())
+                    else:
+                        rows = data.values_list(*columns).iterator()
+                    return ret, [ ('rows', Pending([], _items(rows), rows), ()) ], data
+
+                rows = self.iterate_queryset(data)
             else:
+                rows = iter(data)
 
-                for f in data._meta.fields:
-                    if not f.attname.startswith('_'):
-                        ret[f.attname] = _any(getattr(data, f.attname))
+            return ret, [ ('rows', Pending([], _rows(rows, fields, ret['columns']), rows), ()) ], data
 
-                fields = dir(data.__class__) + ret.keys()
-                add_ons = [k for k in dir(data) if k not in fields]
+        def _value_columns(data, fields=()):
+            """
+            Returns the columns for reading a queryset with `values_list()`,
+            or `None` if not all serialized fields are plain model fields.
+            """
 
-                for k in add_ons:
-                    if not k.__str__().startswith('_'):
-                        ret[k] = _any(getattr(data, k))
+            model = data.model
+            if schema.registry.get(model) is not None or data.query.extra_select or data.query.aggregate_select:
+                return None
 
-            return ret
+            # Resource methods are called with the instance
+            handler = handlers.registry.get(model)
+            if handler is not None and handler.method_fields:
+                return None
+
+            plain = [ f.attname for f in model._meta.fields if not f.rel ]
+            instance = model()
+
+            if isinstance(instance, User) or handler is not None or hasattr(instance, 'serialize_fields') or hasattr(instance, 'get_serialization_fields'):
+                columns = self.field_order(instance)
+            elif fields:
+                columns = list(fields)
+            else:
+                columns = [ f.attname for f in model._meta.fields if not f.attname.startswith('_') ]
+
+            for column in columns:
+                if column not in plain:
+                    return None
 
-        def _qs(data, fields=()):
+            return columns
+
+        def _rows(data, fields, columns):
             """
-            Querysets.
+            Rows of serialized models, in the column order of the first row.
             """
 
-            return [ _any(v, fields) for v in data ]
+            for obj in data:
+                row = _any(obj, fields)
+
+                if not columns:
+                    columns.extend([ k for k in self.field_order(obj) if k in row ])
+                    columns.extend(sorted([ k for k in row if k not in columns ]))
 
-        def _list(data, fields=()):
+                yield None, Pending([ row.get(c) for c in columns ], (), obj), ()
+
+        def _items(data, fields=()):
             """
-            Lists.
+            Lists, querysets and pages.
             """
 
-            return [ _any(v, fields) for v in data ]
+            for v in data:
+                yield None, v, fields
 
         def _dict(data, fields=()):
             """
             Dictionaries.
             """
 
-            return dict([ (k, _any(v, fields)) for k, v in data.iteritems() ])
+            for k, v in data.iteritems():
+                yield k, v, fields
 
-        # Kickstart the seralizin'.
-        return _any(self.data, self.fields)
+        return _any
+
+    def rows(self):
+        """
+        Returns an iterable over the rows of the payload, for emitters
+        that write one item at a time.
+
+        Collections (querysets, lists and pages) are emitted item by item. A
+        dictionary holding a single collection, like the context passed to
+        `SerializeOrRender`, emits the items of that collection. Anything else
+        is emitted as a single row.
+        """
+
+        data = self.collection()
+        if isinstance(data, QuerySet):
+            return self.iterate_queryset(data)
+
+        elif isinstance(data, Page):
+            return data.object_list
+
+        elif isinstance(data, (tuple, list)):
+            return data
+
+        return [data]
+
+    def collection(self):
+        """
+        Returns the collection emitted by `rows`: the payload, or the
+        single collection in a dictionary payload.
+        """
+
+        data = self.data
+        if isinstance(data, dict) and len(data) == 1:
+            value = data.values()[0]
+            if isinstance(value, (QuerySet, Page, tuple, list)):
+                return value
+
+        return data
+
+    def prologue(self, first):
+        """
+        Returns the output written before the rows, and the keyword
+        arguments for `stream` when writing the rows in chunks, given
+        the first row (or `None`). Used for parallel exports.
+        """
+
+        return '', {}
+
+    def field_order(self, obj):
+        """
+        Returns the preferred order of the serialized fields of an
+        object, for emitters writing them as columns.
+        """
+
+        handler = handlers.registry.get(obj.__class__)
+        if handler is not None:
+            fields = handler.fields
+        elif isinstance(obj, User):
+            fields = getattr(settings, 'DYNAMICRESPONSE_DJANGO_USER_FIELDS', ('id', 'email', 'first_name', 'last_name'))
+        elif hasattr(obj, 'serialize_fields'):
+            fields = obj.serialize_fields()
+        elif hasattr(obj, 'get_serialization_fields'):
+            fields = obj.get_serialization_fields()
+        elif isinstance(obj, Model):
+            fields = [f.attname for f in obj._meta.fields]
+        else:
+            fields = ()
+
+        return [f[0] if isinstance(f, (list, tuple)) else f for f in fields]
+
+    def iterate_queryset(self, queryset):
+        """
+        Iterates a queryset without filling its result cache (unless
+        it has already been evaluated), so each instance can be
+        released as soon as it has been serialized.
+        """
+
+        if queryset._result_cache is None:
+            return queryset.iterator()
+
+        return queryset
 
     def in_typemapper(self, model, anonymous):
-        for klass, (km, is_anon) in self.typemapper.iteritems():
-            if model is km and is_anon is anonymous:
-                return klass
+        return self.typemapper_index.get((model, anonymous))
 
     def render(self):
         """
@@ -268,9 +789,164 @@ class JSONEmitter(Emitter):
 
     def render(self):
 
-        indent = 0
+        # Without indentation, the encoder can use its C implementation
+        indent = None
         if settings.DEBUG:
             indent = 4
 
-        seria = simplejson.dumps(self.construct(), cls=DateTimeAwareJSONEncoder, ensure_ascii=False, indent=indent)
+        seria = dumps(self.construct(), indent=indent)
         return seria
+
+class NDJSONEmitter(Emitter):
+    """
+    Newline delimited JSON emitter, writes one serialized object
+    per line for each of the rows in the payload (see `rows`).
+    """
+
+    def stream(self):
+        """
+        Yields the serialized lines as the payload is iterated.
+        """
+
+        serialize = self.serializer()
+        for row in self.rows():
+            yield dumps(serialize(row, self.fields)) + '\n'
+
+    def render(self):
+
+        return ''.join(self.stream())
+
+class EventStreamEmitter(Emitter):
+    """
+    Server-Sent Events emitter, writes one event for each payload
+    produced by the iterable given as payload.
+
+    The iterable may produce `None` when no event is available; a
+    heartbeat comment is then written if nothing has been written for
+    `heartbeat` seconds, so that idle connections are kept open.
+    """
+
+    def stream(self, heartbeat=15):
+        """
+        Yields the serialized events as the payload is iterated.
+        """
+
+        serialize = self.serializer()
+        written = time.time()
+
+        for event in self.data:
+            if event is None:
+                if heartbeat is not None and time.time() - written >= heartbeat:
+                    written = time.time()
+                    yield ':\n\n'
+                continue
+
+            written = time.time()
+
+            # Raw JSON fragments may contain line breaks, which end a data line
+            lines = dumps(serialize(event, self.fields)).splitlines() or ['']
+            yield ''.join(['data: %s\n' % line for line in lines]) + '\n'
+
+    def render(self):
+
+        return ''.join(self.stream())
+
+class CSVEmitter(Emitter):
+    """
+    CSV emitter, writes one line per row in the payload (see `rows`).
+
+    Columns are taken from the first row, in the order given by the model's
+    `serialize_fields()`. Nested objects (such as foreign keys) are flattened
+    into dotted columns, e.g. `author.email`.
+    """
+
+    def columns(self, obj, row, path=()):
+        """
+        Returns the columns for a serialized row as tuples of keys,
+        expanding nested dictionaries.
+        """
+
+        keys = [k for k in self.field_order(obj) if k in row]
+        keys += sorted([k for k in row if k not in keys])
+
+        columns = []
+        for key in keys:
+            value = row[key]
+            if isinstance(value, dict):
+                if isinstance(obj, dict):
+                    child = obj.get(key)
+                else:
+                    child = getattr(obj, key, None)
+                columns.extend(self.columns(child, value, path + (key,)))
+            else:
+                columns.append(path + (key,))
+
+        return columns
+
+    def cell(self, row, column):
+        """
+        Returns the encoded value of a column in a serialized row.
+        """
+
+        value = row
+        for key in column:
+            if not isinstance(value, dict):
+                return ''
+            value = value.get(key)
+
+        if value is None:
+            return ''
+        elif isinstance(value, (dict, list)):
+            value = dumps(value)
+
+        return smart_str(value, settings.DEFAULT_CHARSET)
+
+    def header(self, writer, columns):
+
+        writer.writerow([smart_str('.'.join(c), settings.DEFAULT_CHARSET) for c in columns])
+
+    def row(self, serialize, obj):
+
+        row = serialize(obj, self.fields)
+        if not isinstance(row, dict):
+            row = { 'value': row }
+
+        return row
+
+    def prologue(self, first):
+
+        if first is None:
+            return '', { 'columns': [] }
+
+        columns = self.columns(first, self.row(self.serializer(), first))
+        buffer = StringIO()
+        self.header(csv.writer(buffer), columns)
+
+        return buffer.getvalue(), { 'columns': columns }
+
+    def stream(self, columns=None):
+        """
+        Yields the CSV lines as the payload is iterated, starting with
+        a header row, unless the columns are given.
+        """
+
+        serialize = self.serializer()
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+
+        for obj in self.rows():
+            row = self.row(serialize, obj)
+
+            if columns is None:
+                columns = self.columns(obj, row)
+                self.header(writer, columns)
+
+            writer.writerow([self.cell(row, c) for c in columns])
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def render(self):
+
+        return ''.join(self.stream())
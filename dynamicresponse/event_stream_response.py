@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.http import HttpResponse
+
+from dynamicresponse.emitters import EventStreamEmitter
+
+class EventStreamResponse(HttpResponse):
+    """
+    Provides a Server-Sent Events stream to a client, serializing each
+    payload produced by `events` as it is iterated.
+
+    `events` may produce `None` when no event is available, in which
+    case a heartbeat is sent if the connection has been idle for
+    `heartbeat` seconds.
+    """
+
+    def __init__(self, events, heartbeat=15, **kwargs):
+
+        emitter = EventStreamEmitter(events, {}, None)
+
+        # Status code for the response
+        status_code = kwargs.get('status', 200)
+
+        # Return response with correct payload/type
+        super(EventStreamResponse, self).__init__(
+            emitter.stream(heartbeat),
+            content_type='text/event-stream; charset=%s' % settings.DEFAULT_CHARSET,
+            status=status_code
+        )
+
+        # Events must reach the client as they are written
+        self['Cache-Control'] = 'no-cache'
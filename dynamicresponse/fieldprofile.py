@@ -0,0 +1,111 @@
+"""
+Per-field cost profiling of model serialization.
+
+Finds the fields (typically properties or methods listed in
+`serialize_fields()`) that make serialization slow:
+
+    from dynamicresponse import fieldprofile
+
+    with fieldprofile.profile() as stats:
+        response = client.get('/posts/', HTTP_ACCEPT='application/json')
+
+    print stats.report()
+
+While profiling, the emitter records the wall time and number of
+database queries spent reading each field, by model and field. Related
+objects and querysets (foreign keys and many-to-many fields) are fetched
+when the field is read, so their queries are attributed to the field.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import connections
+
+_state = threading.local()
+
+def _profiles():
+
+    profiles = getattr(_state, 'profiles', None)
+    if profiles is None:
+        profiles = _state.profiles = []
+
+    return profiles
+
+def active():
+    """
+    Returns the profile being recorded in the current thread, or `None`.
+    """
+
+    profiles = _profiles()
+    if profiles:
+        return profiles[-1]
+
+def query_count():
+    """
+    Returns the number of queries logged on all database connections.
+    """
+
+    return sum([len(connection.queries) for connection in connections.all()])
+
+class FieldProfile(object):
+    """
+    Accumulates the number of reads, wall time and number of queries
+    for each `(model, field)`.
+    """
+
+    def __init__(self):
+
+        self.stats = {}
+
+    def record(self, model, field, seconds, queries, reads=1):
+
+        key = ('%s.%s' % (model._meta.app_label, model._meta.object_name), field)
+        stats = self.stats.setdefault(key, [0, 0.0, 0])
+        stats[0] += reads
+        stats[1] += seconds
+        stats[2] += queries
+
+    def top(self, limit=10):
+        """
+        Returns the `(model, field, reads, seconds, queries)` tuples for
+        the most expensive fields, by time.
+        """
+
+        rows = [key + tuple(stats) for key, stats in self.stats.items()]
+        rows.sort(key=lambda row: (row[3], row[4]), reverse=True)
+        return rows[:limit]
+
+    def report(self, limit=10):
+        """
+        Returns a table of the most expensive fields.
+        """
+
+        lines = ['%-40s %8s %10s %8s' % ('field', 'reads', 'seconds', 'queries')]
+        for model, field, reads, seconds, queries in self.top(limit):
+            lines.append('%-40s %8d %10.4f %8d' % ('%s.%s' % (model, field), reads, seconds, queries))
+
+        return '\n'.join(lines)
+
+@contextmanager
+def profile(stats=None):
+    """
+    Records the cost of the fields serialized within the block, in the
+    current thread, into `stats` (or a new `FieldProfile`), which is returned.
+    """
+
+    if stats is None:
+        stats = FieldProfile()
+
+    # Queries are only logged by debug cursors
+    debug_cursors = [(connection, connection.use_debug_cursor) for connection in connections.all()]
+    for connection, _ in debug_cursors:
+        connection.use_debug_cursor = True
+
+    _profiles().append(stats)
+    try:
+        yield stats
+    finally:
+        _profiles().remove(stats)
+        for connection, use_debug_cursor in debug_cursors:
+            connection.use_debug_cursor = use_debug_cursor
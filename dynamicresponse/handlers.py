@@ -0,0 +1,150 @@
+"""
+Per-model serialization handlers.
+
+A handler selects the serialized fields of a model, and may provide
+resource methods, which are called with the instance to produce the
+value of the field of the same name:
+
+    from dynamicresponse import handlers
+
+    class BlogPostHandler(handlers.Handler):
+        model = BlogPost
+        exclude = ('text',)
+        fields = ('id', 'title', 'author', 'summary')
+
+        def summary(self, obj):
+            return obj.text[:100]
+
+    handlers.register(BlogPostHandler)
+
+Handlers are resolved when they are registered, and the emitter looks
+them up by model class. Schemas (see `dynamicresponse.schema`) take
+precedence over handlers.
+"""
+
+import inspect
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Model
+from django.db.models.fields import FieldDoesNotExist
+
+# Attributes of handlers that are not resource methods
+RESERVED_FIELDS = frozenset([
+    'read',
+    'update',
+    'create',
+    'delete',
+    'model',
+    'anonymous',
+    'allowed_methods',
+    'fields',
+    'exclude',
+])
+
+class Handler(object):
+    """
+    Base class for serialization handlers.
+
+    Attributes::
+     - `model`: The model class handled.
+     - `fields`: Names of the serialized fields. Defaults to all model fields
+       (or `DYNAMICRESPONSE_DJANGO_USER_FIELDS` for users).
+     - `exclude`: Names of fields that are never serialized.
+    """
+
+    model = None
+    fields = ()
+    exclude = ()
+
+class CompiledHandler(object):
+    """
+    A registered handler, holding the serialized `fields` (in order) and
+    the resource methods, bound to a handler instance, in `method_fields`.
+    """
+
+    def __init__(self, handler_class):
+
+        self.handler_class = handler_class
+        self.model = handler_class.model
+        self._validate()
+
+        handler = handler_class()
+        fields = handler_class.fields or self._model_fields()
+        self.fields = tuple([f for f in fields if f not in handler_class.exclude])
+
+        self.method_fields = {}
+        for field in self.fields:
+            if isinstance(field, basestring) and field not in RESERVED_FIELDS:
+                method = getattr(handler, field, None)
+                if method is not None and callable(method):
+                    self.method_fields[field] = method
+
+    def _validate(self):
+
+        handler_class = self.handler_class
+        name = handler_class.__name__
+
+        if not (inspect.isclass(self.model) and issubclass(self.model, Model)):
+            raise ImproperlyConfigured('%s.model must be a model class' % name)
+
+        for field in handler_class.fields:
+            if isinstance(field, (list, tuple)):
+                field = field[0]
+            if not (self._has_field(field) or callable(getattr(handler_class, field, None))):
+                raise ImproperlyConfigured('%s.fields: %s has no field or attribute "%s"' % (name, self.model.__name__, field))
+
+    def _has_field(self, name):
+
+        try:
+            self.model._meta.get_field(name)
+            return True
+        except FieldDoesNotExist:
+            return hasattr(self.model, name)
+
+    def _model_fields(self):
+
+        # Ensure that only core (non-sensitive) fields of users are serialized
+        if issubclass(self.model, User):
+            return getattr(settings, 'DYNAMICRESPONSE_DJANGO_USER_FIELDS', ('id', 'email', 'first_name', 'last_name'))
+
+        opts = self.model._meta
+        return [f.name for f in opts.local_fields] + [f.name for f in opts.many_to_many]
+
+class HandlerRegistry(object):
+    """
+    Holds the handler registered for each model.
+    """
+
+    def __init__(self):
+
+        self._handlers = {}
+
+    def register(self, handler_class):
+        """
+        Resolves and registers a handler for its model.
+        Returns the handler class, so it can be used as a class decorator.
+        """
+
+        compiled = CompiledHandler(handler_class)
+        self._handlers[compiled.model] = compiled
+        return handler_class
+
+    def unregister(self, model):
+        """
+        Removes the handler registered for the model, if any.
+        """
+
+        return self._handlers.pop(model, None)
+
+    def get(self, model):
+        """
+        Returns the registered handler for the model class, or `None`.
+        """
+
+        return self._handlers.get(model)
+
+registry = HandlerRegistry()
+register = registry.register
+unregister = registry.unregister
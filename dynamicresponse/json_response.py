@@ -12,7 +12,7 @@ class JsonResponse(HttpResponse):
 
         # Perform JSON serialization
         if object is not None:
-            emitter = JSONEmitter(object, {}, None)
+            emitter = JSONEmitter(object, {}, None, compact=kwargs.get('compact', False), columnar=kwargs.get('columnar', False))
             content = emitter.render()
         else:
             content = ''
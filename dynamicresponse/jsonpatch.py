@@ -0,0 +1,54 @@
+"""
+Generates JSON Patch documents (RFC 6902) between two JSON documents.
+"""
+
+def _pointer(path, key):
+    """
+    Appends a key to a JSON pointer.
+    """
+
+    return '%s/%s' % (path, unicode(key).replace('~', '~0').replace('/', '~1'))
+
+def make_patch(src, dst, path=''):
+    """
+    Returns a list of operations turning `src` into `dst`.
+    """
+
+    if type(src) != type(dst):
+        return [{ 'op': 'replace', 'path': path, 'value': dst }]
+
+    if isinstance(src, dict):
+        ops = []
+
+        for key in src:
+            if key not in dst:
+                ops.append({ 'op': 'remove', 'path': _pointer(path, key) })
+
+        for key, value in dst.iteritems():
+            if key not in src:
+                ops.append({ 'op': 'add', 'path': _pointer(path, key), 'value': value })
+            else:
+                ops.extend(make_patch(src[key], value, _pointer(path, key)))
+
+        return ops
+
+    if isinstance(src, list):
+        ops = []
+        common = min(len(src), len(dst))
+
+        for i in range(common):
+            ops.extend(make_patch(src[i], dst[i], _pointer(path, i)))
+
+        # Remove from the end, so the indexes stay valid
+        for i in reversed(range(common, len(src))):
+            ops.append({ 'op': 'remove', 'path': _pointer(path, i) })
+
+        for value in dst[common:]:
+            ops.append({ 'op': 'add', 'path': _pointer(path, '-'), 'value': value })
+
+        return ops
+
+    if src != dst:
+        return [{ 'op': 'replace', 'path': path, 'value': dst }]
+
+    return []
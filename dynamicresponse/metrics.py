@@ -0,0 +1,247 @@
+"""
+In-process metrics for the middlewares and serialization.
+
+Metrics are recorded when `DYNAMICRESPONSE_METRICS` is `True`, and can be
+exported in the Prometheus text format by `dynamicresponse.views.metrics`.
+Each process keeps its own metrics.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db.models import Model
+from django.db.models.query import QuerySet
+
+from dynamicresponse import admission
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1000, 10000, 100000, 1000000, 10000000)
+
+def enabled():
+    """
+    Returns whether metrics are recorded.
+    """
+
+    return getattr(settings, 'DYNAMICRESPONSE_METRICS', False)
+
+def _escape(value):
+
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+
+    return '{%s}' % ','.join(['%s="%s"' % (name, _escape(value)) for name, value in pairs])
+
+def _format_value(value):
+
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Metric(object):
+    """
+    Base class for metrics, holding a value for each combination of labels.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+
+        return tuple([labels.get(name, '') for name in self.labels])
+
+    def clear(self):
+
+        self.values = {}
+
+    def samples(self):
+        """
+        Returns `(name, labels, value)` tuples for the metric.
+        """
+
+        raise NotImplementedError
+
+    def expose(self):
+        """
+        Returns the metric in the Prometheus text format.
+        """
+
+        lines = [
+            '# HELP %s %s' % (self.name, self.help),
+            '# TYPE %s %s' % (self.name, self.type),
+        ]
+        for name, labels, value in self.samples():
+            lines.append('%s%s %s' % (name, labels, _format_value(value)))
+
+        return '\n'.join(lines) + '\n'
+
+class Counter(Metric):
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+
+        key = self._key(labels)
+        self._lock.acquire()
+        try:
+            self.values[key] = self.values.get(key, 0) + amount
+        finally:
+            self._lock.release()
+
+    def samples(self):
+
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(self.values.items())]
+
+class Histogram(Metric):
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+
+        key = self._key(labels)
+        self._lock.acquire()
+        try:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+        finally:
+            self._lock.release()
+
+    def samples(self):
+
+        samples = []
+        for key, (counts, total) in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, counts):
+                samples.append(('%s_bucket' % self.name, _format_labels(self.labels, key, [('le', _format_value(bound))]), count))
+            samples.append(('%s_sum' % self.name, _format_labels(self.labels, key), total))
+            samples.append(('%s_count' % self.name, _format_labels(self.labels, key), counts[-1]))
+
+        return samples
+
+class Gauge(Metric):
+    """
+    A metric read when exposed, from `collect`, which returns a
+    dictionary of the value for each tuple of label values.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), collect=None, type=None):
+
+        super(Gauge, self).__init__(name, help, labels)
+        self.collect = collect
+        if type is not None:
+            self.type = type
+
+    def samples(self):
+
+        values = self.collect()
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(values.items())]
+
+class Registry(object):
+    """
+    Holds the metrics to export.
+    """
+
+    def __init__(self):
+
+        self.metrics = []
+
+    def register(self, metric):
+
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self):
+        """
+        Resets the values of all metrics.
+        """
+
+        for metric in self.metrics:
+            metric.clear()
+
+    def expose(self):
+        """
+        Returns all metrics in the Prometheus text format.
+        """
+
+        return ''.join([metric.expose() for metric in self.metrics])
+
+registry = Registry()
+
+responses = registry.register(Counter('dynamicresponse_responses_total',
+    'Dynamic responses rendered.', ('view', 'status', 'format')))
+
+response_bytes = registry.register(Histogram('dynamicresponse_response_bytes',
+    'Size of rendered dynamic responses (except streamed responses).', ('view', 'format'), BYTES_BUCKETS))
+
+render_seconds = registry.register(Histogram('dynamicresponse_render_seconds',
+    'Time spent rendering dynamic responses.', ('view', 'format')))
+
+serialize_seconds = registry.register(Histogram('dynamicresponse_serialize_seconds',
+    'Time spent serializing contexts (excluding streamed output).', ('status', 'format', 'model')))
+
+basic_auth_failures = registry.register(Counter('dynamicresponse_basic_auth_failures_total',
+    'Failed Basic authentication attempts.'))
+
+def _admission_stats(name):
+    """
+    Returns a function collecting the admission control statistic for each
+    limiter, labeled by view (or an empty string for the overall limit).
+    """
+
+    def collect():
+        return dict([((key or '',), stats[name]) for key, stats in admission.stats().items()])
+
+    return collect
+
+admission_limit = registry.register(Gauge('dynamicresponse_admission_limit',
+    'Maximum number of dynamic API responses rendered concurrently.', ('view',), _admission_stats('limit')))
+
+admission_active = registry.register(Gauge('dynamicresponse_admission_active',
+    'Dynamic API responses being rendered.', ('view',), _admission_stats('active')))
+
+admission_waiting = registry.register(Gauge('dynamicresponse_admission_waiting',
+    'Requests waiting for their turn to render a dynamic API response.', ('view',), _admission_stats('waiting')))
+
+admission_rejected = registry.register(Gauge('dynamicresponse_admission_rejected_total',
+    'Requests rejected by admission control.', ('view',), _admission_stats('rejected'), type='counter'))
+
+def model_label(data):
+    """
+    Returns the model serialized in the context, as `app_label.model`,
+    or an empty string when not serializing models of a single type.
+    """
+
+    if isinstance(data, dict) and len(data) == 1:
+        data = data.values()[0]
+
+    if isinstance(data, QuerySet):
+        model = data.model
+    elif isinstance(data, Model):
+        model = data.__class__
+    elif isinstance(data, (tuple, list)) and data and isinstance(data[0], Model):
+        model = data[0].__class__
+    else:
+        return ''
+
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
@@ -1,14 +1,22 @@
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
 from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.functional import SimpleLazyObject
+
+from dynamicresponse import metrics, routers, stateless, streaming, tokens
 
 class APIMiddleware:
     """
-    Detects API requests and provides support for Basic authentication.
+    Detects API requests and provides support for Basic and
+    bearer token authentication (see `dynamicresponse.tokens`).
     """
 
     api_accept_types = [
         'application/json',
+        'application/json-patch+json',
+        'application/x-ndjson',
+        'text/csv',
     ]
 
     def process_request(self, request):
@@ -16,9 +24,28 @@ class APIMiddleware:
         # Check if request is API
         self._detect_api_request(request)
 
+        # Route reads for safe API requests to the read replica, if any
+        if getattr(settings, 'DYNAMICRESPONSE_READ_REPLICA', None):
+            if getattr(request, 'is_api', False):
+                routers.route_request(request)
+            else:
+                routers.use_replica(False)
+
+        # Handle authenticated API requests without sessions?
+        if self._is_stateless(request):
+            stateless.prepare(request)
+
+        # Authenticate with a bearer token?
+        token = self._get_bearer_token(request)
+        if token is not None:
+            if not self._perform_token_auth(request, token):
+                return self._require_authentication()
+
         # Should we authenticate based on headers?
-        if self._should_authorize(request):
+        elif self._should_authorize(request):
             if not self._perform_basic_auth(request):
+                if metrics.enabled():
+                    metrics.basic_auth_failures.inc()
                 return self._require_authentication()
 
     def process_response(self, request, response):
@@ -26,6 +53,19 @@ class APIMiddleware:
         if not getattr(request, 'is_api', False):
             return response
 
+        # Was the user loaded for a revoked token?
+        if getattr(request, 'token_revoked', False):
+            response = self._require_authentication()
+
+        if getattr(settings, 'DYNAMICRESPONSE_READ_REPLICA', None):
+            replica = routers.get_replica()
+            routers.use_replica(False)
+            routers.record_write(request, response)
+
+            # Streamed content is read as it is sent, after the request
+            if replica is not None:
+                streaming.wrap(response, enter=lambda: routers.use_replica(True), exit=lambda: routers.use_replica(False))
+
         # Convert redirect from login_required to HTTP 401
         if isinstance(response, HttpResponseRedirect):
             redirect_url = response.get('Location', '')
@@ -37,17 +77,57 @@ class APIMiddleware:
     def _detect_api_request(self, request):
         """
         Detects API request based on the HTTP Accept header.
-        If so, sets is_api on the request.
+        If so, sets is_api on the request, api_format to the
+        accepted API content type with the highest quality (the
+        first one, for equal qualities), and api_format_params
+        to the parameters given for it (e.g. layout=columns).
         """
 
         request.is_api = False
+        request.api_format = None
+        request.api_format_params = {}
         request.accepts = []
+        best_quality = 0
         if 'HTTP_ACCEPT' in request.META:
-            request.accepts = [a.split(';')[0] for a in request.META['HTTP_ACCEPT'].split(',')]
+            for accept in request.META['HTTP_ACCEPT'].split(','):
+                params = accept.split(';')
+                accept_type = params.pop(0).strip()
+                request.accepts.append(accept_type)
+
+                if accept_type in self.api_accept_types:
+                    params = self._parse_params(params)
+                    quality = self._parse_quality(params.pop('q', None))
+                    if quality > best_quality:
+                        request.is_api = True
+                        request.api_format = accept_type
+                        request.api_format_params = params
+                        best_quality = quality
+
+    def _parse_quality(self, value):
+        """
+        Parses the quality (q) parameter of a media type, defaulting to 1.
+        """
+
+        if value is None:
+            return 1.0
 
-        for accept_type in request.accepts:
-            if accept_type in self.api_accept_types:
-                request.is_api = True
+        try:
+            return min(max(float(value), 0.0), 1.0)
+        except ValueError:
+            return 0.0
+
+    def _parse_params(self, params):
+        """
+        Parses media type parameters into a dictionary.
+        """
+
+        parsed = {}
+        for param in params:
+            if '=' in param:
+                key, value = param.split('=', 1)
+                parsed[key.strip().lower()] = value.strip().strip('"')
+
+        return parsed
 
     def _get_auth_string(self, request):
         """
@@ -56,6 +136,51 @@ class APIMiddleware:
 
         return request.META.get('Authorization', None) or request.META.get('HTTP_AUTHORIZATION', None)
 
+    def _is_stateless(self, request):
+        """
+        Returns true for API requests containing HTTP authorization
+        headers, when stateless mode is enabled.
+        """
+
+        if not (getattr(settings, 'DYNAMICRESPONSE_STATELESS_API', False) and getattr(request, 'is_api', False)):
+            return False
+
+        return self._get_auth_string(request) is not None
+
+    def _get_bearer_token(self, request):
+        """
+        Returns the bearer token of an API request, if any.
+        """
+
+        if not getattr(request, 'is_api', False):
+            return None
+
+        auth_string = self._get_auth_string(request)
+        if auth_string and auth_string[:7].lower() == 'bearer ':
+            return auth_string[7:].strip()
+
+    def _perform_token_auth(self, request, token):
+        """
+        Verifies the token, without querying the database. The user
+        is loaded when the view accesses request.user; if the token
+        has been revoked, the view sees an anonymous user, and the
+        response is replaced with a request for authentication.
+        """
+
+        verified = tokens.verify_token(token)
+        if verified is None:
+            return False
+
+        def get_user():
+            user = tokens.get_user(*verified)
+            if user is None:
+                request.token_revoked = True
+                return AnonymousUser()
+            return user
+
+        request.user = SimpleLazyObject(get_user)
+        return True
+
     def _should_authorize(self, request):
         """
         Returns true if the request is an unauthenticated API request,
@@ -108,6 +233,13 @@ class APIMiddleware:
         Returns a request for authentication.
         """
 
-        response = HttpResponse(status=401)
-        response['WWW-Authenticate'] = 'Basic realm="%s"' % getattr(settings, 'DYNAMICRESPONSE_BASIC_REALM_NAME', 'API')
-        return response
+        return require_authentication()
+
+def require_authentication():
+    """
+    Returns a request for authentication.
+    """
+
+    response = HttpResponse(status=401)
+    response['WWW-Authenticate'] = 'Basic realm="%s"' % getattr(settings, 'DYNAMICRESPONSE_BASIC_REALM_NAME', 'API')
+    return response
@@ -1,6 +1,16 @@
+import cProfile
+import math
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import resolve, Resolver404
 from django.http import HttpResponse, QueryDict
 from django.utils import simplejson
 
+from dynamicresponse import admission, metrics, streaming
 from dynamicresponse.response import DynamicResponse
 
 class DynamicFormatMiddleware:
@@ -76,13 +86,148 @@ class DynamicFormatMiddleware:
                 except:
                     return HttpResponse('Invalid JSON', status=400)
 
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        Records the view, for per view concurrency limits,
+        and starts profiling the request when requested.
+        """
+
+        request.view_name = '%s.%s' % (view_func.__module__, getattr(view_func, '__name__', view_func.__class__.__name__))
+
+        if self._should_profile(request):
+            request.profiler = cProfile.Profile()
+            request.profiler.enable()
+
     def process_response(self, request, response):
         """
         Handles rendering dynamic responses.
         """
 
-        # Cause dynamic responses to be rendered
-        if isinstance(response, DynamicResponse):
-            return response.render_response(request, response)
+        profiler = getattr(request, 'profiler', None)
+        if not isinstance(profiler, cProfile.Profile):
+            return self._render_dynamic(request, response)
+
+        del request.profiler
+        write_profile = lambda: profiler.dump_stats(self._profile_path(request))
+        try:
+            response = self._render_dynamic(request, response)
+        except:
+            profiler.disable()
+            write_profile()
+            raise
+
+        profiler.disable()
+
+        # Profile the serialization of streamed content as it is sent,
+        # and write the profile of the view and serialization when done
+        if not streaming.wrap(response, enter=profiler.enable, exit=profiler.disable, close=write_profile):
+            write_profile()
 
         return response
+
+    def _render_dynamic(self, request, response):
+        """
+        Causes dynamic responses to be rendered.
+        """
+
+        if not isinstance(response, DynamicResponse):
+            return response
+
+        if metrics.enabled():
+            return self._render_measured(request, response)
+
+        return self._render(request, response)
+
+    def _render(self, request, response):
+        """
+        Renders the dynamic response, within the concurrency limit for the view.
+        Streamed responses hold their slot until the content has been sent.
+        """
+
+        limiter = self._get_limiter(request)
+        if limiter is None:
+            return response.render_response(request, response)
+
+        timeout = getattr(settings, 'DYNAMICRESPONSE_CONCURRENCY_TIMEOUT', 1)
+        if not limiter.acquire(timeout):
+            res = HttpResponse('Service temporarily unavailable', status=503)
+            res['Retry-After'] = str(int(math.ceil(max(timeout, 1))))
+            return res
+
+        try:
+            res = response.render_response(request, response)
+        except:
+            limiter.release()
+            raise
+
+        if not streaming.wrap(res, close=limiter.release):
+            limiter.release()
+
+        return res
+
+    def _render_measured(self, request, response):
+        """
+        Renders the dynamic response, recording metrics.
+        """
+
+        start = time.time()
+        res = self._render(request, response)
+        elapsed = time.time() - start
+
+        view = getattr(request, 'view_name', '')
+        format = res.get('Content-Type', '').split(';')[0]
+        metrics.responses.inc(view=view, status=response.status[0], format=format)
+        metrics.render_seconds.observe(elapsed, view=view, format=format)
+
+        # Streamed content is only produced as the response is sent
+        if getattr(res, '_is_string', False):
+            metrics.response_bytes.observe(len(res.content), view=view, format=format)
+
+        return res
+
+    def _should_profile(self, request):
+        """
+        Profiles requests from staff users sending the X-Profile header,
+        and a sample of all requests, when a profile directory is set.
+        """
+
+        if getattr(settings, 'DYNAMICRESPONSE_PROFILE_DIR', None) is None:
+            return False
+
+        user = getattr(request, 'user', None)
+        if request.META.get('HTTP_X_PROFILE') and getattr(user, 'is_staff', False):
+            return True
+
+        return random.random() < getattr(settings, 'DYNAMICRESPONSE_PROFILE_SAMPLE_RATE', 0)
+
+    def _profile_path(self, request):
+        """
+        Returns the path of the profile, named after the URL pattern.
+        """
+
+        # Django versions before 1.3 do not name the resolved URL
+        try:
+            name = getattr(resolve(request.path_info), 'url_name', None)
+        except Resolver404:
+            name = None
+
+        name = re.sub(r'[^\w.-]', '_', name or request.view_name)
+        filename = '%s-%d-%d.prof' % (name, time.time() * 1000, os.getpid())
+        return os.path.join(settings.DYNAMICRESPONSE_PROFILE_DIR, filename)
+
+    def _get_limiter(self, request):
+        """
+        Returns the limiter for rendering API responses from the view, if any.
+        """
+
+        if not getattr(request, 'is_api', False):
+            return None
+
+        view_name = getattr(request, 'view_name', None)
+        view_limits = getattr(settings, 'DYNAMICRESPONSE_VIEW_CONCURRENCY_LIMITS', {})
+        if view_name in view_limits:
+            return admission.get_limiter(view_name, view_limits[view_name])
+
+        limit = getattr(settings, 'DYNAMICRESPONSE_CONCURRENCY_LIMIT', None)
+        if limit is not None:
+            return admission.get_limiter(None, limit)
@@ -0,0 +1,16 @@
+from django.db import models
+
+class Tombstone(models.Model):
+    """
+    Records the deletion of an object from a model tracked for change feeds.
+    """
+
+    model = models.CharField(max_length=100, db_index=True)
+    object_id = models.CharField(max_length=255)
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __unicode__(self):
+        return u'%s:%s' % (self.model, self.object_id)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse
+
+from dynamicresponse import parallel
+from dynamicresponse.emitters import NDJSONEmitter
+
+class NDJSONResponse(HttpResponse):
+    """
+    Provides a newline delimited JSON response to a client, streaming
+    one serialized object per line as the payload is iterated.
+    """
+
+    def __init__(self, object=None, **kwargs):
+
+        # Stream the serialized lines as the response is consumed
+        if object is not None:
+            emitter = NDJSONEmitter(object, {}, None)
+            content = emitter.stream()
+
+            # Serialize querysets in worker processes when requested
+            processes = kwargs.get('parallel')
+            if processes:
+                content = parallel.stream(emitter, processes=None if processes is True else processes)
+        else:
+            content = ''
+
+        # Status code for the response
+        status_code = kwargs.get('status', 200)
+
+        # Return response with correct payload/type
+        super(NDJSONResponse, self).__init__(
+            content,
+            content_type='application/x-ndjson; charset=%s' % settings.DEFAULT_CHARSET,
+            status=status_code
+        )
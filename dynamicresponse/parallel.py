@@ -0,0 +1,119 @@
+"""
+Parallel serialization of large querysets for streaming exports.
+
+The queryset is split into ranges of primary keys, which are serialized
+by a pool of worker processes, each with its own database connections.
+The serialized chunks are streamed in order, with a bounded number of
+chunks in flight, so memory use stays capped regardless of the export size.
+
+Querysets are exported in primary key order, and must have integer
+primary keys.
+"""
+
+import multiprocessing
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.models.query import QuerySet
+
+def _shared_connections():
+    """
+    Returns the database connections that can be reopened by another
+    process. In-memory databases only exist in their open connection.
+    """
+
+    return [connection for connection in connections.all() if connection.settings_dict['NAME'] != ':memory:']
+
+def _init_worker():
+    """
+    Drops the database connections inherited from the parent process,
+    so each worker opens its own. Closing them would also close them
+    for the parent, as the socket is shared.
+    """
+
+    for connection in _shared_connections():
+        connection.connection = None
+
+def _serialize_range(emitter_class, model, query, using, lo, hi, options):
+    """
+    Serializes the objects with primary keys in `[lo, hi)`.
+    """
+
+    queryset = QuerySet(model=model, query=query, using=using)
+    queryset = queryset.filter(pk__gte=lo, pk__lt=hi).order_by('pk')
+
+    return ''.join(emitter_class(queryset, {}, None).stream(**options))
+
+def pk_ranges(queryset, size):
+    """
+    Yields `(lo, hi)` ranges of `size` primary keys covering the queryset.
+    """
+
+    bounds = queryset.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return
+
+    for lo in xrange(bounds['lo'], bounds['hi'] + 1, size):
+        yield lo, lo + size
+
+def stream(emitter, processes=None, chunk_size=None):
+    """
+    Yields the output of the emitter's `stream`, serializing the rows
+    in worker processes when they are a queryset (see `Emitter.rows`).
+    """
+
+    queryset = emitter.collection()
+    if not isinstance(queryset, QuerySet) or not queryset.query.can_filter():
+        return emitter.stream()
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'DYNAMICRESPONSE_PARALLEL_CHUNK_SIZE', 10000)
+
+    return _stream(emitter, queryset.order_by('pk'), processes, chunk_size)
+
+def _stream(emitter, queryset, processes, chunk_size):
+
+    first = None
+    for first in queryset[:1]:
+        pass
+
+    prologue, options = emitter.prologue(first)
+    if prologue:
+        yield prologue
+
+    if first is None:
+        return
+
+    # Keep a couple of chunks queued for each worker
+    window = processes * 2
+    pending = deque()
+
+    # Don't share open connections with the workers; they are reopened when needed
+    for connection in _shared_connections():
+        connection.close()
+
+    pool = multiprocessing.Pool(processes, _init_worker)
+
+    try:
+        for lo, hi in pk_ranges(queryset, chunk_size):
+            if len(pending) >= window:
+                yield pending.popleft().get()
+
+            pending.append(pool.apply_async(_serialize_range,
+                (emitter.__class__, queryset.model, queryset.query, queryset.db, lo, hi, options)))
+
+        while pending:
+            yield pending.popleft().get()
+
+        pool.close()
+
+    finally:
+
+        # Stops the workers if the client disconnects, or serialization fails
+        pool.terminate()
+        pool.join()
@@ -1,10 +1,23 @@
+import time
+from hashlib import md5
+
 from django.conf import settings
+from django.core.cache import cache
 from django.forms import Form, ModelForm
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect
 from django.shortcuts import render_to_response
 from django.template import RequestContext
-
+from django.utils import simplejson
+from django.utils.cache import patch_vary_headers
+
+from dynamicresponse import metrics
+from dynamicresponse.changes import InvalidToken, changes_since
+from dynamicresponse.csv_response import CSVResponse
+from dynamicresponse.emitters import dumps
+from dynamicresponse.event_stream_response import EventStreamResponse
 from dynamicresponse.json_response import JsonResponse
+from dynamicresponse.jsonpatch import make_patch
+from dynamicresponse.ndjson_response import NDJSONResponse
 
 CR_OK = ('OK', 200)
 CR_INVALID_DATA = ('INVALID', 400)
@@ -13,6 +26,14 @@ CR_CONFIRM = ('CONFIRM', 405)
 CR_DELETED = ('DELETED', 204)
 CR_REQUIRES_UPGRADE = ('REQUIRES_UPGRADE', 402)
 
+# Response classes for the API formats negotiated by APIMiddleware
+FORMAT_RESPONSES = {
+    'application/json': JsonResponse,
+    'application/json-patch+json': JsonResponse,
+    'application/x-ndjson': NDJSONResponse,
+    'text/csv': CSVResponse,
+}
+
 class DynamicResponse(object):
     """
     Base class for dynamic responses.
@@ -25,15 +46,38 @@ class DynamicResponse(object):
         for arg in kwargs:
             setattr(self, arg, kwargs[arg])
 
-    def serialize(self):
+    def serialize(self, format=None, params=None):
         """
-        Serializes the context as JSON, or returns a HTTP response with corresponding status.
+        Serializes the context as JSON (or another negotiated format),
+        or returns a HTTP response with corresponding status.
+
+        Lists of models are serialized as columns and rows when the
+        `columnar` argument is set, or when requested with the
+        `layout=columns` media type parameter.
+
+        Streaming formats serialize querysets in worker processes when
+        the `parallel` argument is set (to `True`, or a number of processes).
         """
 
+        if not metrics.enabled():
+            return self._serialize(format, params)
+
+        start = time.time()
+        res = self._serialize(format, params)
+        metrics.serialize_seconds.observe(time.time() - start,
+            status=self.status[0], format=format or 'application/json', model=metrics.model_label(self.context))
+
+        return res
+
+    def _serialize(self, format, params):
+
         key, status_code = self.status
 
         if status_code == CR_OK[1]:
-            return JsonResponse(self.context)
+            columnar = getattr(self, 'columnar', False) or (params or {}).get('layout') == 'columns'
+            response_class = FORMAT_RESPONSES.get(format, JsonResponse)
+            return response_class(self.context, compact=getattr(self, 'compact', False), columnar=columnar,
+                parallel=getattr(self, 'parallel', False))
 
         elif status_code == CR_INVALID_DATA[1]:
 
@@ -66,6 +110,42 @@ class DynamicResponse(object):
         # Return blank response for all other status codes
         return JsonResponse(status=status_code)
 
+    def incremental(self, request, res):
+        """
+        Tags a JSON response with an ETag, and keeps the representation
+        for a while. When the client sends the ETag of a representation
+        still kept in `If-None-Match` and accepts JSON Patch, returns a
+        patch against that representation if it is smaller than the full
+        response.
+        """
+
+        if res.status_code != CR_OK[1] or not res.get('Content-Type', '').startswith('application/json'):
+            return res
+
+        content = res.content
+        etag = '"%s"' % md5(content).hexdigest()
+        timeout = getattr(settings, 'DYNAMICRESPONSE_PATCH_TIMEOUT', 300)
+        cache.set(self._representation_key(request, etag), content, timeout)
+
+        prior = request.META.get('HTTP_IF_NONE_MATCH')
+        if prior == etag:
+            res = HttpResponseNotModified()
+
+        elif prior and 'application/json-patch+json' in getattr(request, 'accepts', []):
+            previous = cache.get(self._representation_key(request, prior))
+            if previous is not None:
+                patch = dumps(make_patch(simplejson.loads(previous), simplejson.loads(content))).encode(settings.DEFAULT_CHARSET)
+                if len(patch) < len(content):
+                    res = HttpResponse(patch, content_type='application/json-patch+json; charset=%s' % settings.DEFAULT_CHARSET)
+
+        res['ETag'] = etag
+        patch_vary_headers(res, ('Accept', 'If-None-Match'))
+        return res
+
+    def _representation_key(self, request, etag):
+
+        return 'dynamicresponse.patch.%s' % md5('%s %s' % (request.path, etag)).hexdigest()
+
     def full_context(self):
         """
         Returns context and extra context combined into a single dictionary.
@@ -91,7 +171,9 @@ class SerializeOrRender(DynamicResponse):
     def render_response(self, request, response):
 
         if request.is_api:
-            res = self.serialize()
+            res = self.serialize(getattr(request, 'api_format', None), getattr(request, 'api_format_params', None))
+            if getattr(self, 'patch', False):
+                res = self.incremental(request, res)
         else:
             res = render_to_response(self.template, self.full_context(), RequestContext(request))
 
@@ -115,7 +197,7 @@ class SerializeOrRedirect(DynamicResponse):
     def render_response(self, request, response):
 
         if request.is_api:
-            res = self.serialize()
+            res = self.serialize(getattr(request, 'api_format', None), getattr(request, 'api_format_params', None))
         else:
             res = HttpResponseRedirect(self.url)
 
@@ -137,7 +219,45 @@ class Serialize(DynamicResponse):
 
     def render_response(self, request, response):
 
-        res = self.serialize()
+        res = self.serialize(getattr(request, 'api_format', None), getattr(request, 'api_format_params', None))
+        if getattr(self, 'patch', False):
+            res = self.incremental(request, res)
+
+        if hasattr(self, 'extra_headers'):
+            for header in self.extra_headers:
+                res[header] = self.extra_headers[header]
+
+        return res
+
+class SerializeChanges(DynamicResponse):
+    """
+    Serializes the objects in the queryset changed since the token given
+    in the `since` query parameter, as `changed`, and the primary keys of
+    objects deleted since then, as `deleted`. The token for the next
+    request is returned in the `X-Changes-Token` header.
+
+    `column` must increase with every change to an object. Deletions are
+    only returned for models tracked with `dynamicresponse.changes.track`.
+    """
+
+    token_header = 'X-Changes-Token'
+
+    def __init__(self, queryset, column, context={}, **kwargs):
+
+        super(SerializeChanges, self).__init__(context, **kwargs)
+        self.queryset = queryset
+        self.column = column
+
+    def render_response(self, request, response):
+
+        try:
+            changed, deleted, token = changes_since(self.queryset, self.column, request.GET.get('since'))
+        except InvalidToken:
+            return JsonResponse(status=CR_INVALID_DATA[1])
+
+        self.context = dict(self.context, changed=changed, deleted=deleted)
+        res = self.serialize(getattr(request, 'api_format', None), getattr(request, 'api_format_params', None))
+        res[self.token_header] = token
 
         if hasattr(self, 'extra_headers'):
             for header in self.extra_headers:
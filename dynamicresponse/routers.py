@@ -0,0 +1,110 @@
+"""
+Routing of reads for API requests to a read replica.
+
+Add the router to `DATABASE_ROUTERS`, and set `DYNAMICRESPONSE_READ_REPLICA`
+to the alias of the replica database:
+
+    DATABASE_ROUTERS = ['dynamicresponse.routers.ReplicaRouter']
+    DYNAMICRESPONSE_READ_REPLICA = 'replica'
+
+`APIMiddleware` then routes reads for GET and HEAD API requests to the
+replica, and everything else to the default database. After a write,
+reads from the same client go to the default database for
+`DYNAMICRESPONSE_READ_YOUR_WRITES` seconds, so clients see their own
+changes although the replica lags behind. The time of the write is
+returned in a cookie, and in the `X-Last-Write` header for clients
+sending it back in the same request header instead.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+LAST_WRITE_COOKIE = 'dynamicresponse_last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+_state = threading.local()
+
+def use_replica(enabled):
+    """
+    Routes reads in the current thread to the replica, or not.
+    """
+
+    _state.replica = enabled and getattr(settings, 'DYNAMICRESPONSE_READ_REPLICA', None) or None
+
+def get_replica():
+    """
+    Returns the alias reads in the current thread are routed to, or `None`.
+    """
+
+    return getattr(_state, 'replica', None)
+
+def last_write(request):
+    """
+    Returns the time of the client's last write, from the cookie or header.
+    """
+
+    value = request.META.get('HTTP_X_LAST_WRITE') or request.COOKIES.get(LAST_WRITE_COOKIE)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def route_request(request):
+    """
+    Routes reads for safe API requests to the replica, unless the client
+    has written within the read-your-writes window.
+    """
+
+    enabled = request.method in ('GET', 'HEAD')
+    if enabled:
+        written = last_write(request)
+        window = getattr(settings, 'DYNAMICRESPONSE_READ_YOUR_WRITES', 5)
+        enabled = written is None or written + window < time.time()
+
+    use_replica(enabled)
+
+def record_write(request, response):
+    """
+    Records the time of a write in the response, so the client's
+    following reads go to the default database.
+    """
+
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+        return
+
+    window = getattr(settings, 'DYNAMICRESPONSE_READ_YOUR_WRITES', 5)
+    if window:
+        now = '%.3f' % time.time()
+        response.set_cookie(LAST_WRITE_COOKIE, now, max_age=int(window) + 1)
+        response[LAST_WRITE_HEADER] = now
+
+class ReplicaRouter(object):
+    """
+    Routes reads to the replica while it is enabled for the current thread.
+    """
+
+    def db_for_read(self, model, **hints):
+
+        # Sessions may have been created by the previous request
+        if model._meta.app_label == 'sessions':
+            return None
+
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+
+        # Objects read from the replica are saved to the default database
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+
+        # Objects read from the replica are the same as in the default database
+        databases = (DEFAULT_DB_ALIAS, getattr(settings, 'DYNAMICRESPONSE_READ_REPLICA', None))
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+    def allow_syncdb(self, db, model):
+        return None
@@ -0,0 +1,199 @@
+"""
+Declarative serialization schemas.
+
+A schema describes exactly which fields of a model are serialized, and how:
+
+    from dynamicresponse import schema
+
+    class AuthorSchema(schema.Schema):
+        model = User
+        fields = ('id', 'first_name', 'last_name')
+
+    class BlogPostSchema(schema.Schema):
+        model = BlogPost
+        fields = ('id', 'title', 'text', 'author')
+        rename = { 'text': 'body' }
+        computed = ('word_count',)
+        nested = { 'author': AuthorSchema }
+
+        def word_count(self, obj):
+            return len(obj.text.split())
+
+    schema.register(BlogPostSchema)
+
+Schemas are validated and compiled when they are registered, and the
+emitter uses the compiled schema instead of inspecting every instance.
+"""
+
+import inspect
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Model
+from django.db.models.fields import FieldDoesNotExist
+
+class Schema(object):
+    """
+    Base class for declarative serialization schemas.
+
+    Attributes::
+     - `model`: The model class described by the schema.
+     - `fields`: Names of model fields, properties or methods to include.
+     - `rename`: Maps field names to the keys used in the output.
+     - `computed`: Names of methods on the schema, called with the instance.
+     - `nested`: Maps field names to schemas for the related objects.
+    """
+
+    model = None
+    fields = ()
+    rename = {}
+    computed = ()
+    nested = {}
+
+class CompiledSchema(object):
+    """
+    A validated schema, holding an `(key, getter, nested)` entry for each
+    serialized field. `nested` is the compiled schema for related objects,
+    or `None` when the value is serialized as usual.
+    """
+
+    def __init__(self, schema_class):
+
+        self.schema_class = schema_class
+        self.model = schema_class.model
+        self.entries = []
+
+        self._validate()
+
+    def compile(self):
+        """
+        Builds the entries for the serialized fields.
+        """
+
+        schema = self.schema_class()
+        for name in self.schema_class.fields:
+            self.entries.append((self._key(name), self._field_getter(name), self._nested(name)))
+
+        for name in self.schema_class.computed:
+            self.entries.append((self._key(name), getattr(schema, name), self._nested(name)))
+
+    def _validate(self):
+        """
+        Ensures that the schema only references existing fields and methods.
+        """
+
+        schema_class = self.schema_class
+        name = schema_class.__name__
+
+        if not (inspect.isclass(self.model) and issubclass(self.model, Model)):
+            raise ImproperlyConfigured('%s.model must be a model class' % name)
+
+        for field in schema_class.fields:
+            if not self._has_field(field):
+                raise ImproperlyConfigured('%s.fields: %s has no field or attribute "%s"' % (name, self.model.__name__, field))
+
+        for field in schema_class.computed:
+            if not callable(getattr(schema_class, field, None)):
+                raise ImproperlyConfigured('%s.computed: "%s" is not a method on the schema' % (name, field))
+
+        declared = set(schema_class.fields) | set(schema_class.computed)
+        if len(declared) != len(schema_class.fields) + len(schema_class.computed):
+            raise ImproperlyConfigured('%s declares the same field more than once' % name)
+
+        for field in list(schema_class.rename) + list(schema_class.nested):
+            if field not in declared:
+                raise ImproperlyConfigured('%s: "%s" is not a declared field' % (name, field))
+
+        keys = [self._key(field) for field in declared]
+        if len(set(keys)) != len(keys):
+            raise ImproperlyConfigured('%s renames two fields to the same key' % name)
+
+        for field, nested in schema_class.nested.items():
+            if not (inspect.isclass(nested) and issubclass(nested, Schema)):
+                raise ImproperlyConfigured('%s.nested: "%s" must be a schema class' % (name, field))
+
+    def _has_field(self, name):
+
+        try:
+            self.model._meta.get_field(name)
+            return True
+        except FieldDoesNotExist:
+            return hasattr(self.model, name)
+
+    def _key(self, name):
+
+        return self.schema_class.rename.get(name, name)
+
+    def _field_getter(self, name):
+        """
+        Returns a function reading the field from an instance.
+        Methods taking no arguments are called.
+        """
+
+        attr = getattr(self.model, name, None)
+        if inspect.ismethod(attr) and len(inspect.getargspec(attr)[0]) == 1:
+            return lambda obj: getattr(obj, name)()
+
+        return lambda obj: getattr(obj, name)
+
+    def _nested(self, name):
+
+        nested = self.schema_class.nested.get(name)
+        if nested is not None:
+            return compile_schema(nested)
+
+class SchemaRegistry(object):
+    """
+    Holds the compiled schema for each registered model.
+    """
+
+    def __init__(self):
+
+        self._schemas = {}
+
+    def register(self, schema_class):
+        """
+        Validates, compiles and registers a schema for its model.
+        Returns the schema class, so it can be used as a class decorator.
+        """
+
+        compiled = compile_schema(schema_class)
+        self._schemas[compiled.model] = compiled
+        return schema_class
+
+    def unregister(self, model):
+        """
+        Removes the schema registered for the model, if any.
+        """
+
+        return self._schemas.pop(model, None)
+
+    def get(self, model):
+        """
+        Returns the compiled schema for the model class, or `None`.
+        """
+
+        return self._schemas.get(model)
+
+def compile_schema(schema_class):
+    """
+    Validates the schema class and returns a `CompiledSchema`.
+    Compiled schemas are cached on the schema class.
+    """
+
+    compiled = schema_class.__dict__.get('_compiled')
+    if compiled is None:
+
+        # Cache before compiling, so schemas may nest themselves
+        compiled = CompiledSchema(schema_class)
+        schema_class._compiled = compiled
+        try:
+            compiled.compile()
+        except:
+            del schema_class._compiled
+            raise
+
+    return compiled
+
+registry = SchemaRegistry()
+register = registry.register
+unregister = registry.unregister
@@ -0,0 +1,60 @@
+"""
+Stateless handling of authenticated API requests.
+
+When `DYNAMICRESPONSE_STATELESS_API` is `True`, `APIMiddleware` handles
+API requests authenticated with Basic authentication or bearer tokens
+without sessions: the session is an empty dictionary which is never
+loaded or saved, CSRF checks are skipped (the requests cannot rely on
+cookies), and messages are discarded.
+"""
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.base import BaseStorage
+from django.contrib.sessions.backends.base import SessionBase
+
+class StatelessSession(SessionBase):
+    """
+    A session which is never loaded or saved.
+    """
+
+    # Changes are never persisted, so never report them
+    modified = property(lambda self: False, lambda self, value: None)
+
+    def load(self):
+        return {}
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+class StatelessMessageStorage(BaseStorage):
+    """
+    Message storage discarding all messages.
+    """
+
+    def _get(self, *args, **kwargs):
+        return [], True
+
+    def _store(self, messages, response, *args, **kwargs):
+        return []
+
+def prepare(request):
+    """
+    Replaces the session, user and messages of the request, and skips
+    CSRF checks. The user is then set by authentication.
+    """
+
+    request.session = StatelessSession()
+    request.user = AnonymousUser()
+    request.csrf_processing_done = True
+
+    if hasattr(request, '_messages'):
+        request._messages = StatelessMessageStorage(request)
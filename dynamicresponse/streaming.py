@@ -0,0 +1,77 @@
+"""
+Hooks around producing the streamed content of responses.
+
+Streamed responses (NDJSON, CSV, parallel exports and Server-Sent Events)
+are serialized as the content is iterated, after the middleware has
+returned the response. `wrap` runs state that should cover the
+serialization (e.g. a concurrency slot or database routing) around the
+iteration instead.
+"""
+
+class StreamedContent(object):
+    """
+    Iterates content, calling `enter` and `exit` around producing each
+    chunk, and `close` once, when the content is exhausted or fails, or
+    the response is closed.
+    """
+
+    def __init__(self, content, enter=None, exit=None, close=None):
+
+        self.content = content
+        self.enter = enter
+        self.exit = exit
+        self.on_close = close
+        self.closed = False
+
+    def __iter__(self):
+
+        iterator = iter(self.content)
+        try:
+            while True:
+                if self.enter is not None:
+                    self.enter()
+                try:
+                    chunk = iterator.next()
+                finally:
+                    if self.exit is not None:
+                        self.exit()
+
+                yield chunk
+
+        except StopIteration:
+            pass
+
+        finally:
+            self.close()
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            if hasattr(self.content, 'close'):
+                self.content.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+def is_streamed(response):
+    """
+    Returns whether the content of the response is produced as it is iterated.
+    """
+
+    return not getattr(response, '_is_string', True)
+
+def wrap(response, enter=None, exit=None, close=None):
+    """
+    Wraps the streamed content of the response (see `StreamedContent`).
+    Returns false, without wrapping, when the content is not streamed.
+    """
+
+    if not is_streamed(response):
+        return False
+
+    response._container = StreamedContent(response._container, enter, exit, close)
+    return True
@@ -0,0 +1,95 @@
+"""
+Signed, expiring bearer tokens for API authentication.
+
+Tokens are issued for a user with `issue_token` (or the
+`dynamicresponse.views.issue_token` view), and sent by clients in
+`Authorization: Bearer <token>` headers. `APIMiddleware` verifies the
+signature and expiry of the token without querying the database, and
+loads the user only when the view accesses `request.user`.
+
+A token is signed with the `SECRET_KEY` and `DYNAMICRESPONSE_TOKEN_SALT`
+settings, and holds a revocation tag: a signature of the user's password
+hash, which is compared when the user is loaded. Changing the password
+revokes the user's tokens, and changing the salt revokes all tokens.
+"""
+
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+def _signature(value):
+
+    key = hashlib.sha256('dynamicresponse.tokens%s%s' % (settings.SECRET_KEY, getattr(settings, 'DYNAMICRESPONSE_TOKEN_SALT', ''))).digest()
+    return hmac.new(key, value, hashlib.sha256).hexdigest()
+
+def _constant_time_compare(a, b):
+
+    if len(a) != len(b):
+        return False
+
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+
+    return result == 0
+
+def revocation_tag(user):
+    """
+    Returns a signature of the user's password hash, which changes with
+    the password without revealing anything about the hash.
+    """
+
+    return _signature('revocation.%s' % user.password)[:16]
+
+def issue_token(user, expires_in=None):
+    """
+    Returns a token for the user, and the time it expires (as a timestamp).
+    Tokens expire after `DYNAMICRESPONSE_TOKEN_EXPIRY` seconds by default.
+    """
+
+    if expires_in is None:
+        expires_in = getattr(settings, 'DYNAMICRESPONSE_TOKEN_EXPIRY', 86400)
+
+    expires = int(time.time() + expires_in)
+    value = '%s.%d.%s' % (user.pk, expires, revocation_tag(user))
+    return '%s.%s' % (value, _signature(value)), expires
+
+def verify_token(token):
+    """
+    Returns the user id and revocation tag in a valid token,
+    or `None` if the token is invalid or has expired.
+    """
+
+    try:
+        value, signature = str(token).rsplit('.', 1)
+        user_id, expires, tag = value.split('.')
+        expires = int(expires)
+    except (ValueError, UnicodeEncodeError):
+        return None
+
+    if not _constant_time_compare(signature, _signature(value)):
+        return None
+
+    if expires < time.time():
+        return None
+
+    return user_id, tag
+
+def get_user(user_id, tag):
+    """
+    Returns the active user the token was issued for, or `None` if
+    the user is gone or the password has changed since then.
+    """
+
+    try:
+        user = User.objects.get(pk=user_id, is_active=True)
+    except (User.DoesNotExist, ValueError):
+        return None
+
+    if not _constant_time_compare(revocation_tag(user), tag):
+        return None
+
+    return user
@@ -0,0 +1,25 @@
+from django.http import HttpResponse
+
+from dynamicresponse import metrics as metrics_registry
+from dynamicresponse import tokens
+from dynamicresponse.middleware.api import require_authentication
+from dynamicresponse.response import Serialize
+
+def metrics(request):
+    """
+    Exports the metrics of the process in the Prometheus text format.
+    """
+
+    return HttpResponse(metrics_registry.registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def issue_token(request):
+    """
+    Issues a bearer token for the authenticated user (e.g. with Basic
+    authentication), returning the token and its expiry timestamp.
+    """
+
+    if not request.user.is_authenticated():
+        return require_authentication()
+
+    token, expires = tokens.issue_token(request.user)
+    return Serialize({ 'token': token, 'expires': expires })
@@ -1,5 +1,17 @@
 from api import *
+from changes import *
+from codegen import *
+from csv_response import *
 from dynamicformat import *
+from event_stream_response import *
+from emitters import *
+from fieldprofile import *
+from handlers import *
 from json_response import *
+from metrics import *
+from ndjson_response import *
+from parallel import *
 from response import *
+from routers import *
+from schema import *
 from views import *
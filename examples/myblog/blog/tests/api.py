@@ -1,11 +1,18 @@
+import base64
+import time
 import unittest
 
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.db import connection
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.test import TestCase
+from django.test.client import Client
+from django.utils import simplejson
 from mock import Mock
 
+from dynamicresponse import stateless, tokens, views
 from dynamicresponse.middleware.api import APIMiddleware
 
 
@@ -77,6 +84,27 @@ class ApiTest(unittest.TestCase):
         self.request.META['HTTP_ACCEPT'] = 'application/json'
         self.api._detect_api_request(self.request)
         self.assertTrue(self.request.is_api)
+        self.assertEqual(self.request.api_format, 'application/json')
+
+        self.request.META['HTTP_ACCEPT'] = 'application/x-ndjson,application/json'
+        self.api._detect_api_request(self.request)
+        self.assertTrue(self.request.is_api)
+        self.assertEqual(self.request.api_format, 'application/x-ndjson')
+
+        self.request.META['HTTP_ACCEPT'] = 'text/html,application/json; layout=columns; q=0.9'
+        self.api._detect_api_request(self.request)
+        self.assertEqual(self.request.accepts, ['text/html', 'application/json'])
+        self.assertEqual(self.request.api_format, 'application/json')
+        self.assertEqual(self.request.api_format_params, { 'layout': 'columns' })
+
+        self.request.META['HTTP_ACCEPT'] = 'text/csv;q=0.1, application/json'
+        self.api._detect_api_request(self.request)
+        self.assertEqual(self.request.api_format, 'application/json')
+
+        self.request.META['HTTP_ACCEPT'] = 'text/html, application/json;q=0'
+        self.api._detect_api_request(self.request)
+        self.assertFalse(self.request.is_api)
+        self.assertEqual(self.request.api_format, None)
 
     def testGetAuthStringReturnsStringInAuthenticationHeader(self):
         no_auth = HttpRequest()
@@ -157,3 +185,163 @@ class ApiLogInTests(TestCase):
         self.assertTrue(self.api._perform_basic_auth(request))
         self.assertTrue(request.user.is_authenticated())
         self.assertEquals(request.user, User.objects.get(id=1))
+
+
+class ApiTokenTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('tokenuser', 'token@example.com', 'password')
+        self.token, self.expires = tokens.issue_token(self.user)
+
+    def request(self, token):
+        request = HttpRequest()
+        request.META['HTTP_ACCEPT'] = 'application/json'
+        request.META['HTTP_AUTHORIZATION'] = 'Bearer %s' % token
+        return request
+
+    def testValidTokenAuthenticatesWithoutQueries(self):
+        request = self.request(self.token)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(APIMiddleware().process_request(request) is None)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(request.user.pk, self.user.pk)
+            self.assertTrue(request.user.is_authenticated())
+
+    def testTokenDoesNotContainPasswordHash(self):
+        algorithm, salt, digest = self.user.password.split('$')
+        self.assertFalse(salt in self.token or digest[:16] in self.token)
+
+    def testExpiredTokenIsRejectedWithoutQueries(self):
+        token, expires = tokens.issue_token(self.user, expires_in=-1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(tokens.verify_token(token), None)
+
+    def testTamperedTokenReturns401(self):
+        user_id, rest = self.token.split('.', 1)
+        response = APIMiddleware().process_request(self.request('%d.%s' % (self.user.pk + 1, rest)))
+
+        self.assertEqual(response.status_code, 401)
+
+    def testExpiredTokenReturns401(self):
+        token, expires = tokens.issue_token(self.user, expires_in=-1)
+        response = APIMiddleware().process_request(self.request(token))
+
+        self.assertEqual(response.status_code, 401)
+
+    def testChangingPasswordRevokesToken(self):
+        self.user.set_password('changed')
+        self.user.save()
+        request = self.request(self.token)
+        api = APIMiddleware()
+
+        self.assertTrue(api.process_request(request) is None)
+        self.assertFalse(request.user.is_authenticated())
+        self.assertEqual(api.process_response(request, HttpResponse()).status_code, 401)
+
+    def testChangingSaltRevokesTokens(self):
+        settings.DYNAMICRESPONSE_TOKEN_SALT = 'changed'
+        try:
+            response = APIMiddleware().process_request(self.request(self.token))
+        finally:
+            del settings.DYNAMICRESPONSE_TOKEN_SALT
+
+        self.assertEqual(response.status_code, 401)
+
+    def testTokenIsIgnoredForNonApiRequests(self):
+        request = self.request(self.token)
+        request.META['HTTP_ACCEPT'] = 'text/html'
+
+        self.assertEqual(APIMiddleware()._get_bearer_token(request), None)
+
+    def testIssueTokenView(self):
+        request = HttpRequest()
+        request.user = self.user
+        response = views.issue_token(request)
+        token = response.context['token']
+
+        self.assertEqual(tokens.verify_token(token), (str(self.user.pk), tokens.revocation_tag(self.user)))
+        self.assertTrue(response.context['expires'] > time.time())
+
+    def testIssueTokenViewRequiresAuthentication(self):
+        request = HttpRequest()
+        request.user = AnonymousUser()
+
+        self.assertEqual(views.issue_token(request).status_code, 401)
+
+    def testTokenAuthenticatedRequest(self):
+        response = self.client.get('/', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION='Bearer %s' % self.token)
+        self.assertEqual(response.status_code, 200)
+
+
+class ApiStatelessTests(TestCase):
+
+    def setUp(self):
+        settings.DYNAMICRESPONSE_STATELESS_API = True
+        self.user = User.objects.create_user('stateless', 'stateless@example.com', 'password')
+        self.auth = 'Basic %s' % base64.b64encode('stateless:password')
+
+        # Start with a stored session
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.login(username='stateless', password='password')
+
+    def tearDown(self):
+        del settings.DYNAMICRESPONSE_STATELESS_API
+
+    def session_queries(self, *args, **kwargs):
+        """
+        Returns the response and the queries on the session table.
+        """
+
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            response = self.client.get(*args, **kwargs)
+            queries = [q['sql'] for q in connection.queries[start:] if 'django_session' in q['sql']]
+        finally:
+            connection.use_debug_cursor = False
+
+        return response, queries
+
+    def testBasicAuthenticatedRequestsDoNotUseSessions(self):
+        sessions = Session.objects.count()
+        response, queries = self.session_queries('/', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertFalse(settings.SESSION_COOKIE_NAME in response.cookies)
+        self.assertEqual(Session.objects.count(), sessions)
+
+    def testTokenAuthenticatedRequestsDoNotUseSessions(self):
+        token, expires = tokens.issue_token(self.user)
+        response, queries = self.session_queries('/', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION='Bearer %s' % token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def testOtherRequestsUseSessions(self):
+        response, queries = self.session_queries('/', HTTP_ACCEPT='application/json')
+        self.assertNotEqual(queries, [])
+
+    def testCSRFChecksAreSkipped(self):
+        data = simplejson.dumps({ 'title': 'Title', 'text': 'Text' })
+        response = self.client.post('/create/', data, content_type='application/json', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=self.auth)
+
+        self.assertEqual(response.status_code, 200)
+
+    def testCSRFChecksAreEnforcedWithoutStatelessMode(self):
+        del settings.DYNAMICRESPONSE_STATELESS_API
+        data = simplejson.dumps({ 'title': 'Title', 'text': 'Text' })
+        response = self.client.post('/create/', data, content_type='application/json', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION=self.auth)
+        settings.DYNAMICRESPONSE_STATELESS_API = True
+
+        self.assertEqual(response.status_code, 403)
+
+    def testStatelessSessionIsNeverSaved(self):
+        session = stateless.StatelessSession()
+        session['key'] = 'value'
+
+        self.assertEqual(session['key'], 'value')
+        self.assertFalse(session.modified)
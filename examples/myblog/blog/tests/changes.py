@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from django.db import models
+from django.http import QueryDict
+from django.test import TestCase
+from django.utils import simplejson
+from mock import Mock
+
+from dynamicresponse import changes
+from dynamicresponse.models import Tombstone
+from dynamicresponse.response import SerializeChanges
+
+
+class RevisionedPost(models.Model):
+    title = models.CharField('Title', max_length=200)
+    revision = models.IntegerField()
+
+    class Meta:
+        app_label = 'blog'
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'title',
+            'revision'
+        ]
+
+
+class ChangesTest(TestCase):
+
+    def setUp(self):
+        changes.track(RevisionedPost)
+        self.first = RevisionedPost.objects.create(title='First', revision=1)
+        self.second = RevisionedPost.objects.create(title='Second', revision=2)
+
+    def tearDown(self):
+        changes.untrack(RevisionedPost)
+
+    def sync(self, token=None):
+        changed, deleted, token = changes.changes_since(RevisionedPost.objects.all(), 'revision', token)
+        return [post.title for post in changed], deleted, token
+
+    def testWithoutTokenReturnsAllObjects(self):
+        changed, deleted, token = self.sync()
+
+        self.assertEqual(changed, ['First', 'Second'])
+        self.assertEqual(deleted, [])
+
+    def testReturnsChangesSinceToken(self):
+        token = self.sync()[2]
+        self.first.title = 'Updated'
+        self.first.revision = 3
+        self.first.save()
+
+        changed, deleted, token = self.sync(token)
+        self.assertEqual(changed, ['Updated'])
+        self.assertEqual(deleted, [])
+
+        self.assertEqual(self.sync(token)[:2], ([], []))
+
+    def testReturnsDeletionsSinceToken(self):
+        token = self.sync()[2]
+        pk = self.second.pk
+        self.second.delete()
+
+        changed, deleted, token = self.sync(token)
+        self.assertEqual(changed, [])
+        self.assertEqual(deleted, [pk])
+
+        self.assertEqual(self.sync(token)[:2], ([], []))
+
+    def testUntrackedModelsRecordNoTombstones(self):
+        changes.untrack(RevisionedPost)
+        self.second.delete()
+
+        self.assertEqual(Tombstone.objects.count(), 0)
+
+    def testUntrackedModelsDoNotQueryTombstones(self):
+        changes.untrack(RevisionedPost)
+        token = self.sync()[2]
+
+        with self.assertNumQueries(2):
+            changed, deleted, token = self.sync(token)
+
+        self.assertEqual(deleted, [])
+
+    def testTokenRoundTripsDatetimes(self):
+        field = models.DateTimeField()
+        value = datetime(2012, 3, 4, 5, 6, 7, 890)
+
+        self.assertEqual(changes.decode_token(changes.encode_token(value, 5), field), (value, 5))
+
+    def testInvalidTokenRaisesInvalidToken(self):
+        self.assertRaises(changes.InvalidToken, self.sync, 'invalid')
+
+
+class SerializeChangesTest(TestCase):
+
+    def setUp(self):
+        changes.track(RevisionedPost)
+        RevisionedPost.objects.create(title='First', revision=1)
+
+    def tearDown(self):
+        changes.untrack(RevisionedPost)
+
+    def render(self, since=None):
+        request = Mock()
+        request.api_format = 'application/json'
+        request.api_format_params = {}
+        request.GET = QueryDict(since and 'since=%s' % since or '')
+        return SerializeChanges(RevisionedPost.objects.all(), 'revision').render_response(request, None)
+
+    def testReturnsChangesAndToken(self):
+        result = self.render()
+        token = result['X-Changes-Token']
+        self.assertEqual([post['title'] for post in simplejson.loads(result.content)['changed']], ['First'])
+
+        post = RevisionedPost.objects.create(title='Second', revision=2)
+        pk = post.pk
+        post.delete()
+
+        content = simplejson.loads(self.render(token).content)
+        self.assertEqual(content['changed'], [])
+        self.assertEqual(content['deleted'], [pk])
+
+    def testInvalidTokenReturns400(self):
+        self.assertEqual(self.render('invalid').status_code, 400)
@@ -0,0 +1,70 @@
+# encoding=utf-8
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models
+from django.test import TestCase
+from django.utils import simplejson
+
+from dynamicresponse import codegen
+from dynamicresponse.json_response import JsonResponse
+
+from blog.models import BlogPost
+
+
+class ModelWithPrice(models.Model):
+    title = models.CharField('Title', max_length=200)
+    price = models.DecimalField('Price', max_digits=6, decimal_places=2)
+    buyer = models.ForeignKey(User, related_name='+')
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'title',
+            'price',
+            'buyer',
+            'label'
+        ]
+
+    def label(self):
+        return u'%s (%s)' % (self.title, self.price)
+
+
+class CompiledSerializerTest(TestCase):
+
+    def setUp(self):
+        settings.DYNAMICRESPONSE_COMPILED_SERIALIZERS = 'verify'
+
+        for i in range(3):
+            BlogPost.objects.create(title=u'Pøst %d' % i, text=u'Text')
+
+    def tearDown(self):
+        del settings.DYNAMICRESPONSE_COMPILED_SERIALIZERS
+
+    def testGeneratedSerializerMatchesGenericPath(self):
+        obj = ModelWithPrice(id=1, title=u'Hådouken', price=Decimal('9.50'),
+                             buyer=User(id=2, email='john.doe@example.com', first_name='John', last_name='Doe'))
+
+        result = simplejson.loads(JsonResponse({ 'obj': obj, 'posts': BlogPost.objects.all() }).content)
+
+        self.assertEqual(result['obj'], {
+            'id': 1,
+            'title': u'Hådouken',
+            'price': '9.50',
+            'label': u'Hådouken (9.50)',
+            'buyer': { 'id': 2, 'email': 'john.doe@example.com', 'first_name': 'John', 'last_name': 'Doe' },
+        })
+        self.assertEqual(result['posts'][2], { 'id': 3, 'title': u'Pøst 2', 'text': u'Text' })
+
+    def testSerializerIsCachedPerModelAndFieldSet(self):
+        first = codegen.get_serializer(BlogPost, ['id', 'title'])
+        self.assertTrue(first is codegen.get_serializer(BlogPost, ('title', 'id')))
+        self.assertFalse(first is codegen.get_serializer(BlogPost, ['id']))
+
+        serialize, consumed = first
+        self.assertEqual(consumed, frozenset(['id', 'title']))
+        self.assertTrue('obj.title' in serialize.source)
+
+    def testVerifyRaisesOnMismatch(self):
+        self.assertRaises(codegen.SerializerMismatch, codegen.verify, BlogPost, { 'id': 1 }, { 'id': 2 })
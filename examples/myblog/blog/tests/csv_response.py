@@ -0,0 +1,69 @@
+# encoding=utf-8
+import csv
+import unittest
+from cStringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.http import HttpResponse
+from django.test import TestCase
+
+from dynamicresponse.csv_response import CSVResponse
+from dynamicresponse.emitters import CSVEmitter
+
+from blog.models import BlogPost
+
+
+class ModelWithAuthor(models.Model):
+    title = models.CharField('Title', max_length=200)
+    author = models.ForeignKey(User, related_name='+')
+
+    def serialize_fields(self):
+        return [
+            'title',
+            'id',
+            'author'
+        ]
+
+
+def parse(content):
+    return list(csv.reader(StringIO(content)))
+
+
+class CSVResponseTest(unittest.TestCase):
+
+    def testIsInstanceOfHttpResponse(self):
+        self.assertTrue(isinstance(CSVResponse([]), HttpResponse), 'should be an instance of HttpResponse')
+
+    def testSetsCorrectMimetype(self):
+        self.assertEqual(CSVResponse([])['Content-Type'], 'text/csv; charset=utf-8')
+
+    def testColumnsFollowSerializeFieldsAndFlattenForeignKeys(self):
+        author = User(id=5, email='john.doe@example.com', first_name=u'Jøhn', last_name='Doe')
+        obj = ModelWithAuthor(id=1, title=u'Hello, Wørld', author=author)
+
+        rows = parse(CSVResponse({ 'objects': [obj] }).content)
+
+        self.assertEqual(rows[0], ['title', 'id', 'author.id', 'author.email', 'author.first_name', 'author.last_name'])
+        self.assertEqual(rows[1], ['Hello, W\xc3\xb8rld', '1', '5', 'john.doe@example.com', 'J\xc3\xb8hn', 'Doe'])
+
+    def testDictionaryRowsUseSortedColumns(self):
+        rows = parse(CSVResponse([{ 'b': None, 'a': { 'c': [1, 2] } }]).content)
+
+        self.assertEqual(rows, [['a.c', 'b'], ['[1, 2]', '']])
+
+
+class CSVQuerySetTest(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            BlogPost.objects.create(title=u'Post %d' % i, text=u'Line\nbreak')
+
+    def testQuerySetIsStreamedRowByRow(self):
+        posts = BlogPost.objects.all()
+        chunks = list(CSVEmitter({ 'posts': posts }, {}, None).stream())
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(parse(''.join(chunks))[0], ['id', 'title', 'text'])
+        self.assertEqual(parse(''.join(chunks))[3], ['3', 'Post 2', 'Line\nbreak'])
+        self.assertTrue(posts._result_cache is None, 'queryset result cache should not be filled')
@@ -1,9 +1,21 @@
+import cProfile
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.http import HttpRequest, HttpResponse, QueryDict
+from django.test import TestCase
 from django.utils.simplejson import loads, dumps
 from mock import Mock
 
+from dynamicresponse import admission
 from dynamicresponse.middleware.dynamicformat import DynamicFormatMiddleware
 from dynamicresponse.response import DynamicResponse
 
@@ -71,3 +83,170 @@ class DynamicFormatTest(unittest.TestCase):
         response.render_response = Mock()
         self.dynamicformat.process_response(request, response)
         self.assertTrue(response.render_response.called, 'render_response was not called')
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dynamicformat = DynamicFormatMiddleware()
+        self.request = HttpRequest()
+        self.request.is_api = True
+        self.response = DynamicResponse()
+        self.response.render_response = Mock(return_value=HttpResponse('rendered'))
+        settings.DYNAMICRESPONSE_CONCURRENCY_TIMEOUT = 0
+
+    def tearDown(self):
+        for name in ('DYNAMICRESPONSE_CONCURRENCY_LIMIT', 'DYNAMICRESPONSE_VIEW_CONCURRENCY_LIMITS', 'DYNAMICRESPONSE_CONCURRENCY_TIMEOUT'):
+            if hasattr(settings, name):
+                delattr(settings, name)
+
+    def testRendersWithoutLimit(self):
+        self.assertEqual(self.dynamicformat.process_response(self.request, self.response).content, 'rendered')
+
+    def testRejectsWhenLimitIsReached(self):
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        limiter = admission.get_limiter(None, 1)
+        limiter.acquire(0)
+        try:
+            result = self.dynamicformat.process_response(self.request, self.response)
+        finally:
+            limiter.release()
+
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(result['Retry-After'], '1')
+        self.assertFalse(self.response.render_response.called)
+        self.assertEqual(admission.stats()[None]['rejected'], 1)
+
+    def testReleasesAfterRendering(self):
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        self.dynamicformat.process_response(self.request, self.response)
+        result = self.dynamicformat.process_response(self.request, self.response)
+
+        self.assertEqual(result.content, 'rendered')
+        self.assertEqual(admission.stats()[None]['active'], 0)
+
+    def testStreamedResponseHoldsSlotUntilSent(self):
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        self.response.render_response = Mock(return_value=HttpResponse(iter(['a', 'b'])))
+        result = self.dynamicformat.process_response(self.request, self.response)
+
+        self.assertEqual(admission.stats()[None]['active'], 1)
+        self.assertEqual(list(result), ['a', 'b'])
+        self.assertEqual(admission.stats()[None]['active'], 0)
+
+    def testClosingStreamedResponseReleasesSlot(self):
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        self.response.render_response = Mock(return_value=HttpResponse(iter(['a', 'b'])))
+        result = self.dynamicformat.process_response(self.request, self.response)
+        result.close()
+
+        self.assertEqual(admission.stats()[None]['active'], 0)
+
+    def testOnlyApiResponsesAreLimited(self):
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        self.request.is_api = False
+        admission.get_limiter(None, 1).acquire(0)
+        try:
+            result = self.dynamicformat.process_response(self.request, self.response)
+        finally:
+            admission.get_limiter(None, 1).release()
+
+        self.assertEqual(result.content, 'rendered')
+
+    def testPerViewLimits(self):
+        def view(request):
+            pass
+
+        settings.DYNAMICRESPONSE_CONCURRENCY_LIMIT = 1
+        settings.DYNAMICRESPONSE_VIEW_CONCURRENCY_LIMITS = { '%s.view' % __name__: 2 }
+        self.dynamicformat.process_view(self.request, view, (), {})
+        admission.get_limiter(None, 1).acquire(0)
+        try:
+            result = self.dynamicformat.process_response(self.request, self.response)
+        finally:
+            admission.get_limiter(None, 1).release()
+
+        self.assertEqual(result.content, 'rendered')
+        self.assertEqual(admission.stats()['%s.view' % __name__]['limit'], 2)
+
+    def testQueuedRequestIsAdmittedOnRelease(self):
+        limiter = admission.Limiter(1)
+        limiter.acquire(0)
+        results = []
+
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire(5)))
+        waiter.start()
+        while limiter.waiting == 0:
+            time.sleep(0.001)
+        limiter.release()
+        waiter.join()
+
+        self.assertEqual(results, [True])
+        self.assertEqual(limiter.stats(), { 'limit': 1, 'active': 1, 'waiting': 0, 'rejected': 0 })
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings.DYNAMICRESPONSE_PROFILE_DIR = self.directory
+        self.user = User.objects.create_user('staff', 'staff@example.com', 'password')
+        self.user.is_staff = True
+        self.user.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        del settings.DYNAMICRESPONSE_PROFILE_DIR
+        if hasattr(settings, 'DYNAMICRESPONSE_PROFILE_SAMPLE_RATE'):
+            del settings.DYNAMICRESPONSE_PROFILE_SAMPLE_RATE
+
+    def profiles(self):
+        return os.listdir(self.directory)
+
+    def testStaffHeaderWritesProfile(self):
+        self.client.login(username='staff', password='password')
+        self.client.get('/', HTTP_ACCEPT='application/json', HTTP_X_PROFILE='1')
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith('list_posts-'))
+
+        stats = pstats.Stats(os.path.join(self.directory, profiles[0]))
+        functions = [function for filename, line, function in stats.stats]
+        self.assertTrue('list_posts' in functions)
+        self.assertTrue('construct' in functions)
+
+    def testStreamedSerializationIsProfiled(self):
+        self.client.login(username='staff', password='password')
+        response = self.client.get('/', HTTP_ACCEPT='application/x-ndjson', HTTP_X_PROFILE='1')
+        self.assertEqual(self.profiles(), [])
+        response.content
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+
+        stats = pstats.Stats(os.path.join(self.directory, profiles[0]))
+        functions = [function for filename, line, function in stats.stats]
+        self.assertTrue('list_posts' in functions)
+        self.assertTrue('stream' in functions)
+
+    def testProfilerIsDisabledWhenRenderingFails(self):
+        request = HttpRequest()
+        request.path_info = '/'
+        request.profiler = cProfile.Profile()
+        request.profiler.enable()
+        response = DynamicResponse()
+        response.render_response = Mock(side_effect=ValueError)
+
+        self.assertRaises(ValueError, DynamicFormatMiddleware().process_response, request, response)
+        self.assertTrue(sys.getprofile() is None)
+        self.assertEqual(len(self.profiles()), 1)
+
+    def testHeaderIsIgnoredForOtherUsers(self):
+        self.client.get('/', HTTP_ACCEPT='application/json', HTTP_X_PROFILE='1')
+        self.assertEqual(self.profiles(), [])
+
+    def testSampledRequestsAreProfiled(self):
+        settings.DYNAMICRESPONSE_PROFILE_SAMPLE_RATE = 1
+        self.client.get('/', HTTP_ACCEPT='application/json')
+        self.assertEqual(len(self.profiles()), 1)
@@ -0,0 +1,240 @@
+import base64
+import unittest
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import models
+from django.test import TestCase
+from django.utils.unittest import skipIf
+
+from dynamicresponse.emitters import Emitter, numpy
+
+from blog.models import BlogPost
+
+
+class ModelWithParent(models.Model):
+    name = models.CharField('Name', max_length=200)
+    parent = models.ForeignKey('self', null=True, related_name='+')
+
+    def serialize_fields(self):
+        return [
+            'name',
+            'parent'
+        ]
+
+
+class ModelWithAuthor(models.Model):
+    title = models.CharField('Title', max_length=200)
+    author = models.ForeignKey(User, related_name='+')
+
+    class Meta:
+        app_label = 'blog'
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'title',
+            'author'
+        ]
+
+
+def construct(data, **kwargs):
+    return Emitter(data, {}, None, **kwargs).construct()
+
+
+class ConstructTest(unittest.TestCase):
+
+    def tearDown(self):
+        if hasattr(settings, 'DYNAMICRESPONSE_MAX_DEPTH'):
+            del settings.DYNAMICRESPONSE_MAX_DEPTH
+
+    def testNestedStructuresAreSerialized(self):
+        data = { 'a': [1, (2, Decimal('3.5')), { 'b': None }], 'c': lambda: [u'x'] }
+        self.assertEqual(construct(data), { 'a': [1, [2, '3.5'], { 'b': None }], 'c': [u'x'] })
+
+    def testDatesDecimalsAndUUIDsArePreConverted(self):
+        data = {
+            'datetime': datetime(2012, 5, 17, 13, 30, 5),
+            'date': date(1850, 1, 2),
+            'time': time(8, 15),
+            'decimal': Decimal('0.10'),
+            'uuid': uuid.UUID('12345678123456781234567812345678'),
+        }
+
+        self.assertEqual(construct(data), {
+            'datetime': '2012-05-17 13:30:05',
+            'date': '1850-01-02',
+            'time': '08:15:00',
+            'decimal': '0.10',
+            'uuid': u'12345678-1234-5678-1234-567812345678',
+        })
+
+    def testNestedModelsAreSerialized(self):
+        root = ModelWithParent(name='root')
+        child = ModelWithParent(name='child', parent=root)
+
+        self.assertEqual(construct([child]), [{ 'name': 'child', 'parent': { 'name': 'root', 'parent': None } }])
+
+    def testRepeatedObjectsAreNotCycles(self):
+        shared = { 'x': 1 }
+        self.assertEqual(construct([shared, { 'y': shared }]), [{ 'x': 1 }, { 'y': { 'x': 1 } }])
+
+    def testCyclesAreDetected(self):
+        data = { 'a': [] }
+        data['a'].append(data)
+        self.assertRaises(ValueError, construct, data)
+
+        obj = ModelWithParent(name='loop')
+        obj.parent = obj
+        self.assertRaises(ValueError, construct, obj)
+
+    def testDepthIsLimited(self):
+        data = []
+        for i in range(10):
+            data = [data]
+
+        settings.DYNAMICRESPONSE_MAX_DEPTH = 10
+        self.assertRaises(ValueError, construct, data)
+
+        settings.DYNAMICRESPONSE_MAX_DEPTH = 11
+        self.assertEqual(len(construct(data)), 1)
+
+    def testDeepStructuresDoNotRecurse(self):
+        data = []
+        for i in range(5000):
+            data = [data]
+
+        settings.DYNAMICRESPONSE_MAX_DEPTH = None
+        result = construct(data)
+
+        for i in range(5000):
+            result = result[0]
+        self.assertEqual(result, [])
+
+
+class IdentityMapTest(TestCase):
+
+    fixtures = ['test_data']
+
+    def setUp(self):
+        for i in range(5):
+            ModelWithAuthor.objects.create(title='Post %d' % i, author_id=1)
+
+    def tearDown(self):
+        if hasattr(settings, 'DYNAMICRESPONSE_IDENTITY_MAP'):
+            del settings.DYNAMICRESPONSE_IDENTITY_MAP
+
+    def testRepeatedObjectsAreSerializedOnce(self):
+        posts = ModelWithAuthor.objects.all()
+
+        # One query for the posts, and one for the shared author
+        with self.assertNumQueries(2):
+            result = construct(posts)
+
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result[4]['author']['email'], 'john.doe@example.com')
+        self.assertTrue(result[0]['author'] is result[4]['author'])
+
+    def testIdentityMapCanBeDisabled(self):
+        settings.DYNAMICRESPONSE_IDENTITY_MAP = False
+        with self.assertNumQueries(6):
+            construct(ModelWithAuthor.objects.all())
+
+    def testCompactModeMovesRepeatedObjectsToSideTable(self):
+        result = construct({ 'posts': ModelWithAuthor.objects.all(), 'user': User.objects.get(id=1) }, compact=True)
+
+        self.assertEqual(result['objects'].keys(), ['auth.user:1'])
+        self.assertEqual(result['objects']['auth.user:1']['email'], 'john.doe@example.com')
+        self.assertEqual(result['data']['user'], { '$ref': 'auth.user:1' })
+
+        for post in result['data']['posts']:
+            self.assertEqual(post['author'], { '$ref': 'auth.user:1' })
+
+    def testCompactModeKeepsUniqueObjectsInPlace(self):
+        result = construct(ModelWithAuthor.objects.filter(id=1), compact=True)
+
+        self.assertEqual(result['objects'], {})
+        self.assertEqual(result['data'][0]['author']['id'], 1)
+
+
+class ColumnarTest(TestCase):
+
+    fixtures = ['test_data']
+
+    def setUp(self):
+        for i in range(3):
+            BlogPost.objects.create(title='Post %d' % i, text='Text')
+            ModelWithAuthor.objects.create(title='Post %d' % i, author_id=1)
+
+    def testQuerySetIsReadWithValuesList(self):
+        with self.assertNumQueries(1):
+            result = construct({ 'posts': BlogPost.objects.all() }, columnar=True)
+
+        self.assertEqual(result['posts'], {
+            'columns': ['id', 'title', 'text'],
+            'rows': [[1, 'Post 0', 'Text'], [2, 'Post 1', 'Text'], [3, 'Post 2', 'Text']],
+        })
+
+    def testRelatedObjectsAreSerializedPerRow(self):
+        result = construct(ModelWithAuthor.objects.all(), columnar=True)
+
+        self.assertEqual(result['columns'], ['id', 'title', 'author'])
+        self.assertEqual(result['rows'][2][:2], [3, 'Post 2'])
+        self.assertEqual(result['rows'][2][2]['email'], 'john.doe@example.com')
+
+    def testListsOfModelsAreColumnar(self):
+        result = construct([ModelWithParent(name='a'), ModelWithParent(name='b')], columnar=True)
+        self.assertEqual(result, { 'columns': ['name', 'parent'], 'rows': [['a', None], ['b', None]] })
+
+    def testEmptyQuerySetsAreColumnar(self):
+        self.assertEqual(construct(BlogPost.objects.none(), columnar=True), { 'columns': ['id', 'title', 'text'], 'rows': [] })
+        self.assertEqual(construct(Paginator(BlogPost.objects.none(), 2).page(1), columnar=True)['rows'], [])
+
+    def testEmptyListsAreLeftAsIs(self):
+        self.assertEqual(construct({ 'tags': [], 'names': ['a'] }, columnar=True), { 'tags': [], 'names': ['a'] })
+
+    def testPagesAreColumnar(self):
+        page = Paginator(BlogPost.objects.all(), 2).page(2)
+        result = construct(page, columnar=True)
+
+        self.assertEqual(result, { 'columns': ['id', 'title', 'text'], 'rows': [[3, 'Post 2', 'Text']] })
+
+    def testMixedListsAreLeftAsIs(self):
+        self.assertEqual(construct([ModelWithParent(name='a'), 1], columnar=True), [{ 'name': 'a', 'parent': None }, 1])
+
+
+@skipIf(numpy is None, 'NumPy is not installed')
+class NumPyTest(unittest.TestCase):
+
+    def tearDown(self):
+        if hasattr(settings, 'DYNAMICRESPONSE_NUMPY_BASE64_THRESHOLD'):
+            del settings.DYNAMICRESPONSE_NUMPY_BASE64_THRESHOLD
+
+    def testArraysAndScalarsAreConverted(self):
+        data = {
+            'ints': numpy.arange(4).reshape(2, 2),
+            'floats': numpy.array([0.5, 1.5], dtype=numpy.float32),
+            'strings': numpy.array(['a', 'b']),
+            'scalar': numpy.int16(7),
+            'bool': numpy.bool_(True),
+        }
+
+        result = construct(data)
+
+        self.assertEqual(result, { 'ints': [[0, 1], [2, 3]], 'floats': [0.5, 1.5], 'strings': [u'a', u'b'], 'scalar': 7, 'bool': True })
+        self.assertTrue(type(result['scalar']) is int)
+
+    def testLargeArraysAreBase64Encoded(self):
+        settings.DYNAMICRESPONSE_NUMPY_BASE64_THRESHOLD = 3
+        data = numpy.array([[1.0, 2.0], [3.0, 4.0]])
+
+        result = construct({ 'small': numpy.arange(2), 'large': data })
+
+        self.assertEqual(result['small'], [0, 1])
+        self.assertEqual(result['large']['shape'], [2, 2])
+        decoded = numpy.frombuffer(base64.b64decode(result['large']['data']), dtype=result['large']['dtype'])
+        self.assertTrue((decoded.reshape(result['large']['shape']) == data).all())
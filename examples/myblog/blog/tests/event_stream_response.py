@@ -0,0 +1,45 @@
+import unittest
+
+from django.http import HttpResponse
+from django.utils import simplejson
+from mock import patch
+
+from dynamicresponse.emitters import RawJSON
+from dynamicresponse.response import EventStreamResponse
+
+from blog.models import BlogPost
+
+
+class EventStreamResponseTest(unittest.TestCase):
+
+    def testIsInstanceOfHttpResponse(self):
+        self.assertTrue(isinstance(EventStreamResponse([]), HttpResponse), 'should be an instance of HttpResponse')
+
+    def testSetsHeaders(self):
+        response = EventStreamResponse([])
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def testEachPayloadIsAnEvent(self):
+        post = BlogPost(id=1, title='Title', text='Text')
+        response = EventStreamResponse(iter([{ 'a': 1 }, post]))
+        events = response.content.split('\n\n')
+
+        self.assertEqual(events[2], '')
+        self.assertEqual(simplejson.loads(events[0][len('data: '):]), { 'a': 1 })
+        self.assertEqual(simplejson.loads(events[1][len('data: '):]), { 'id': 1, 'title': 'Title', 'text': 'Text' })
+
+    def testEventsAreWrittenOnOneLine(self):
+        response = EventStreamResponse([{ 'text': 'multiple\nlines' }])
+        self.assertEqual(response.content, 'data: {"text": "multiple\\nlines"}\n\n')
+
+    def testMultilineRawJSONIsWrittenOnDataLines(self):
+        response = EventStreamResponse([{ 'a': RawJSON('{\n"x": 1}') }])
+        self.assertEqual(response.content, 'data: {"a": {\ndata: "x": 1}}\n\n')
+
+    def testHeartbeatIsWrittenWhenIdle(self):
+        clock = iter([0, 5, 20, 21, 22])
+        with patch('time.time', lambda: clock.next()):
+            response = EventStreamResponse([None, None, 1], heartbeat=15)
+            self.assertEqual(response.content, ':\n\ndata: 1\n\n')
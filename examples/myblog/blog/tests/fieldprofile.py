@@ -0,0 +1,111 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from dynamicresponse import fieldprofile
+from dynamicresponse.emitters import Emitter
+
+from blog.models import BlogPost
+from blog.tests.emitters import ModelWithAuthor
+
+
+class ModelWithCount(BlogPost):
+
+    class Meta:
+        app_label = 'blog'
+        proxy = True
+
+    def post_count(self):
+        return BlogPost.objects.count()
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'title',
+            'post_count'
+        ]
+
+
+class FieldProfileTest(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            BlogPost.objects.create(title='Post %d' % i, text='Text')
+
+    def testRecordsQueriesPerField(self):
+        posts = ModelWithCount.objects.all()
+        with fieldprofile.profile() as stats:
+            data = Emitter(posts, {}, None).construct()
+
+        self.assertEqual([post['post_count'] for post in data], [3, 3, 3])
+        self.assertEqual(stats.stats[('blog.ModelWithCount', 'post_count')][0], 3)
+        self.assertEqual(stats.stats[('blog.ModelWithCount', 'post_count')][2], 3)
+        self.assertEqual(stats.stats[('blog.ModelWithCount', 'title')][2], 0)
+
+        top = stats.top(1)[0]
+        self.assertEqual(top[:2], ('blog.ModelWithCount', 'post_count'))
+        self.assertTrue('blog.ModelWithCount.post_count' in stats.report().splitlines()[1])
+
+    def testCompiledSerializersAreProfiled(self):
+        settings.DYNAMICRESPONSE_COMPILED_SERIALIZERS = True
+        try:
+            with fieldprofile.profile() as stats:
+                Emitter(BlogPost.objects.all(), {}, None).construct()
+        finally:
+            del settings.DYNAMICRESPONSE_COMPILED_SERIALIZERS
+
+        self.assertEqual(stats.stats[('blog.BlogPost', 'title')][0], 3)
+
+    def testRelatedObjectsAreAttributedToField(self):
+        user = User.objects.create_user('author', 'author@example.com')
+        post = ModelWithAuthor.objects.create(title='Title', author=user)
+        post = ModelWithAuthor.objects.get(pk=post.pk)
+
+        with fieldprofile.profile() as stats:
+            data = Emitter(post, {}, None).construct()
+
+        self.assertEqual(data['author']['email'], 'author@example.com')
+        self.assertEqual(stats.stats[('blog.ModelWithAuthor', 'author')][2], 1)
+
+    def testIdentityMapIsRespected(self):
+        user = User.objects.create_user('author', 'author@example.com')
+        for i in range(20):
+            ModelWithAuthor.objects.create(title='Title %d' % i, author=user)
+
+        with self.assertNumQueries(2):
+            Emitter(ModelWithAuthor.objects.all(), {}, None).construct()
+
+        with fieldprofile.profile() as stats:
+            with self.assertNumQueries(2):
+                Emitter(ModelWithAuthor.objects.all(), {}, None).construct()
+
+        self.assertEqual(stats.stats[('blog.ModelWithAuthor', 'author')][0], 20)
+        self.assertEqual(stats.stats[('blog.ModelWithAuthor', 'author')][2], 1)
+
+    def testOtherThreadsAreNotRecorded(self):
+        thread = threading.Thread(target=lambda: Emitter([BlogPost(id=1, title='Title')], {}, None).construct())
+        with fieldprofile.profile() as stats:
+            self.assertTrue(fieldprofile.active() is stats)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(stats.stats, {})
+
+    def testAccumulatesAcrossBlocks(self):
+        stats = fieldprofile.FieldProfile()
+        for i in range(2):
+            with fieldprofile.profile(stats):
+                Emitter(ModelWithCount.objects.all(), {}, None).construct()
+
+        self.assertEqual(stats.stats[('blog.ModelWithCount', 'post_count')][:1], [6])
+
+    def testNothingIsRecordedOutsideBlock(self):
+        with fieldprofile.profile() as stats:
+            pass
+        Emitter(ModelWithCount.objects.all(), {}, None).construct()
+
+        self.assertEqual(stats.stats, {})
+        self.assertFalse(connection.use_debug_cursor)
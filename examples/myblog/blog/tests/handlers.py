@@ -0,0 +1,111 @@
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.utils import simplejson
+
+from dynamicresponse import handlers
+from dynamicresponse.emitters import Emitter
+from dynamicresponse.json_response import JsonResponse
+
+
+class ModelWithHandler(models.Model):
+    title = models.CharField('Title', max_length=200)
+    text = models.TextField('Text')
+    owner = models.ForeignKey(User, related_name='+')
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'text'
+        ]
+
+
+class ModelWithHandlerHandler(handlers.Handler):
+    model = ModelWithHandler
+    fields = ('id', 'title', 'summary')
+
+    def summary(self, obj):
+        return obj.text[:6]
+
+
+class ExcludingHandler(handlers.Handler):
+    model = ModelWithHandler
+    exclude = ('text', 'owner')
+
+
+class UserHandler(handlers.Handler):
+    model = User
+    exclude = ('email',)
+
+
+class HandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        handlers.register(ModelWithHandlerHandler)
+
+        self.obj = ModelWithHandler(id=3, title='Hadouken', text='Street Fighter',
+                                    owner=User(id=1, username='johndoe', password='secret'))
+
+    def tearDown(self):
+        handlers.unregister(ModelWithHandler)
+
+    def testRegisteredHandlerIsUsedInPlaceOfModelFields(self):
+        result = simplejson.loads(JsonResponse(self.obj).content)
+
+        self.assertEqual(result, { 'id': 3, 'title': 'Hadouken', 'summary': 'Street' })
+
+    def testUnregisteredModelFallsBackToSerializeFields(self):
+        handlers.unregister(ModelWithHandler)
+        result = simplejson.loads(JsonResponse(self.obj).content)
+
+        self.assertEqual(result, { 'id': 3, 'text': 'Street Fighter' })
+
+    def testExcludedFieldsAreNotSerialized(self):
+        handlers.register(ExcludingHandler)
+        result = simplejson.loads(JsonResponse(self.obj).content)
+
+        self.assertEqual(result, { 'id': 3, 'title': 'Hadouken' })
+
+    def testUserHandlerDefaultsToCoreUserFields(self):
+        handlers.register(UserHandler)
+        try:
+            result = simplejson.loads(JsonResponse(self.obj.owner).content)
+        finally:
+            handlers.unregister(User)
+
+        self.assertEqual(result, { 'id': 1, 'first_name': '', 'last_name': '' })
+
+    def testMethodFieldsAreResolvedOnRegistration(self):
+        compiled = handlers.registry.get(ModelWithHandler)
+
+        self.assertEqual(compiled.fields, ('id', 'title', 'summary'))
+        self.assertEqual(compiled.method_fields.keys(), ['summary'])
+        self.assertEqual(compiled.method_fields['summary'](self.obj), 'Street')
+
+    def testFieldOrderFollowsHandler(self):
+        self.assertEqual(Emitter(None, {}, None).field_order(self.obj), ['id', 'title', 'summary'])
+
+    def testInvalidHandlersAreRejectedOnRegistration(self):
+
+        class UnknownField(handlers.Handler):
+            model = ModelWithHandler
+            fields = ('id', 'does_not_exist')
+
+        class NoModel(handlers.Handler):
+            fields = ('id',)
+
+        for handler_class in (UnknownField, NoModel):
+            self.assertRaises(ImproperlyConfigured, handlers.register, handler_class)
+
+
+class TypemapperTest(unittest.TestCase):
+
+    def testLookupIsIndexedByModelAndAnonymity(self):
+        typemapper = { ModelWithHandlerHandler: (ModelWithHandler, False), ExcludingHandler: (ModelWithHandler, True) }
+        emitter = Emitter(None, typemapper, None)
+
+        self.assertTrue(emitter.in_typemapper(ModelWithHandler, False) is ModelWithHandlerHandler)
+        self.assertTrue(emitter.in_typemapper(ModelWithHandler, True) is ExcludingHandler)
+        self.assertTrue(emitter.in_typemapper(User, True) is None)
@@ -3,10 +3,14 @@ import unittest
 
 from django.db import models
 from django.http import HttpResponse
+from django.test import TestCase
 from django.utils import simplejson
 
+from dynamicresponse.emitters import RawJSON
 from dynamicresponse.json_response import JsonResponse
 
+from blog.models import BlogPost
+
 
 class ModelWithSerializeFields(models.Model):
     title = models.CharField('Title', max_length=200)
@@ -81,3 +85,34 @@ class JsonResponseTest(unittest.TestCase):
 
         for key, value in result.items():
             self.assertEqual(to_equal.get(key).__str__(), value.__str__())
+
+    def testRawJSONFragmentsAreSplicedVerbatim(self):
+        fragment = '{"cached":[1,2,{"nested":"\xc3\xa6"}]}'
+        response = JsonResponse({ 'a': RawJSON(fragment), 'b': [RawJSON('null'), 2] })
+
+        self.assertTrue(fragment in response.content)
+        self.assertEqual(simplejson.loads(response.content), {
+            'a': { 'cached': [1, 2, { 'nested': u'\xe6' }] },
+            'b': [None, 2],
+        })
+
+
+class JsonResponseQuerySetTest(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            BlogPost.objects.create(title=u'Post %d' % i, text=u'Text')
+
+    def testQuerySetIsSerializedWithoutFillingResultCache(self):
+        posts = BlogPost.objects.all()
+        result = simplejson.loads(JsonResponse({ 'posts': posts }).content)
+
+        self.assertEqual([p['title'] for p in result['posts']], [u'Post 0', u'Post 1', u'Post 2'])
+        self.assertTrue(posts._result_cache is None, 'queryset result cache should not be filled')
+
+    def testEvaluatedQuerySetIsReused(self):
+        posts = BlogPost.objects.all()
+        list(posts)
+
+        result = simplejson.loads(JsonResponse({ 'posts': posts }).content)
+        self.assertEqual(len(result['posts']), 3)
@@ -0,0 +1,106 @@
+import base64
+
+from django.conf import settings
+from django.core.urlresolvers import resolve
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from dynamicresponse import admission, metrics
+from dynamicresponse.views import metrics as metrics_view
+
+from blog.models import BlogPost
+
+
+class MetricsRegistryTest(TestCase):
+
+    def testCounterExposition(self):
+        counter = metrics.Counter('requests_total', 'Requests.', ('view',))
+        counter.inc(view='a')
+        counter.inc(2, view='b "quoted"')
+
+        self.assertEqual(counter.expose(), '\n'.join([
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{view="a"} 1',
+            'requests_total{view="b \\"quoted\\""} 2',
+        ]) + '\n')
+
+    def testHistogramExposition(self):
+        histogram = metrics.Histogram('size', 'Size.', buckets=(10, 100))
+        histogram.observe(5)
+        histogram.observe(50)
+
+        self.assertEqual(histogram.expose(), '\n'.join([
+            '# HELP size Size.',
+            '# TYPE size histogram',
+            'size_bucket{le="10"} 1',
+            'size_bucket{le="100"} 2',
+            'size_bucket{le="+Inf"} 2',
+            'size_sum 55',
+            'size_count 2',
+        ]) + '\n')
+
+    def testAdmissionStatsAreExposed(self):
+        limiter = admission.get_limiter('metrics.view', 3)
+        limiter.acquire(0)
+        try:
+            exposed = metrics.registry.expose()
+        finally:
+            limiter.release()
+
+        self.assertTrue('# TYPE dynamicresponse_admission_active gauge' in exposed)
+        self.assertTrue('dynamicresponse_admission_limit{view="metrics.view"} 3' in exposed)
+        self.assertTrue('dynamicresponse_admission_active{view="metrics.view"} 1' in exposed)
+        self.assertTrue('dynamicresponse_admission_waiting{view="metrics.view"} 0' in exposed)
+        self.assertTrue('# TYPE dynamicresponse_admission_rejected_total counter' in exposed)
+
+    def testModelLabel(self):
+        self.assertEqual(metrics.model_label({ 'posts': BlogPost.objects.all() }), 'blog.blogpost')
+        self.assertEqual(metrics.model_label({ 'post': BlogPost() }), 'blog.blogpost')
+        self.assertEqual(metrics.model_label({ 'a': 1, 'b': 2 }), '')
+
+
+class MetricsMiddlewareTest(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        settings.DYNAMICRESPONSE_METRICS = True
+        BlogPost.objects.create(title='Title', text='Text')
+        self.view = '%s.list_posts' % resolve('/').func.__module__
+
+    def tearDown(self):
+        del settings.DYNAMICRESPONSE_METRICS
+        metrics.registry.clear()
+
+    def testResponsesAreRecorded(self):
+        response = self.client.get('/', HTTP_ACCEPT='application/json')
+
+        self.assertEqual(metrics.responses.values, { (self.view, 'OK', 'application/json'): 1 })
+        self.assertEqual(metrics.response_bytes.values[(self.view, 'application/json')][1], len(response.content))
+        self.assertEqual(metrics.render_seconds.values.keys(), [(self.view, 'application/json')])
+        self.assertEqual(metrics.serialize_seconds.values.keys(), [('OK', 'application/json', 'blog.blogpost')])
+
+    def testStreamedResponsesAreNotMeasured(self):
+        self.client.get('/', HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(metrics.responses.values, { (self.view, 'OK', 'application/x-ndjson'): 1 })
+        self.assertEqual(metrics.response_bytes.values, {})
+
+    def testBasicAuthFailuresAreCounted(self):
+        self.client.get('/', HTTP_ACCEPT='application/json', HTTP_AUTHORIZATION='Basic %s' % base64.b64encode('user:wrong'))
+        self.assertEqual(metrics.basic_auth_failures.values, { (): 1 })
+
+    def testNothingIsRecordedWhenDisabled(self):
+        del settings.DYNAMICRESPONSE_METRICS
+        self.client.get('/', HTTP_ACCEPT='application/json')
+        settings.DYNAMICRESPONSE_METRICS = True
+
+        self.assertEqual(metrics.responses.values, {})
+        self.assertEqual(metrics.serialize_seconds.values, {})
+
+    def testMetricsView(self):
+        self.client.get('/', HTTP_ACCEPT='application/json')
+        response = metrics_view(RequestFactory().get('/metrics/'))
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertTrue('dynamicresponse_responses_total{view="%s",status="OK",format="application/json"} 1\n' % self.view in response.content)
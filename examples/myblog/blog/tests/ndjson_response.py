@@ -0,0 +1,58 @@
+# encoding=utf-8
+import unittest
+
+from django.http import HttpResponse
+from django.test import TestCase
+from django.utils import simplejson
+
+from dynamicresponse.emitters import NDJSONEmitter
+from dynamicresponse.ndjson_response import NDJSONResponse
+from dynamicresponse.response import DynamicResponse
+
+from blog.models import BlogPost
+
+
+class NDJSONResponseTest(unittest.TestCase):
+
+    def testIsInstanceOfHttpResponse(self):
+        self.assertTrue(isinstance(NDJSONResponse([]), HttpResponse), 'should be an instance of HttpResponse')
+
+    def testSetsCorrectMimetype(self):
+        self.assertEqual(NDJSONResponse([])['Content-Type'], 'application/x-ndjson; charset=utf-8')
+
+    def testListIsEmittedOneItemPerLine(self):
+        response = NDJSONResponse([{ 'a': 1 }, { 'b': 2 }, 3])
+        lines = response.content.splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(simplejson.loads(lines[0]), { 'a': 1 })
+        self.assertEqual(simplejson.loads(lines[1]), { 'b': 2 })
+        self.assertEqual(simplejson.loads(lines[2]), 3)
+
+    def testSingleCollectionInContextIsUnwrapped(self):
+        response = NDJSONResponse({ 'items': [1, 2] })
+        self.assertEqual(response.content, '1\n2\n')
+
+    def testOtherPayloadsAreEmittedAsSingleLine(self):
+        response = NDJSONResponse({ 'a': 1, 'b': [1, 2] })
+        self.assertEqual(simplejson.loads(response.content), { 'a': 1, 'b': [1, 2] })
+
+    def testSerializeReturnsNDJSONResponseForNegotiatedFormat(self):
+        result = DynamicResponse({ 'items': [] }).serialize('application/x-ndjson')
+        self.assertTrue(isinstance(result, NDJSONResponse), 'should return an instance of NDJSONResponse')
+
+
+class NDJSONQuerySetTest(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            BlogPost.objects.create(title=u'Post %d' % i, text=u'Ørret')
+
+    def testQuerySetIsStreamedWithoutFillingResultCache(self):
+        posts = BlogPost.objects.all()
+        lines = list(NDJSONEmitter({ 'posts': posts }, {}, None).stream())
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(simplejson.loads(lines[0])['title'], u'Post 0')
+        self.assertEqual(simplejson.loads(lines[2])['text'], u'Ørret')
+        self.assertTrue(posts._result_cache is None, 'queryset result cache should not be filled')
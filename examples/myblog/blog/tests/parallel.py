@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+
+from dynamicresponse import parallel
+from dynamicresponse.csv_response import CSVResponse
+from dynamicresponse.emitters import NDJSONEmitter
+from dynamicresponse.ndjson_response import NDJSONResponse
+
+from blog.models import BlogPost
+
+
+class ParallelExportTest(TestCase):
+
+    def setUp(self):
+        for i in range(25):
+            BlogPost.objects.create(title='Post %d' % i, text='Text %d' % i)
+
+        # Leave a gap in the primary keys
+        BlogPost.objects.filter(title__in=['Post 5', 'Post 6', 'Post 7']).delete()
+        settings.DYNAMICRESPONSE_PARALLEL_CHUNK_SIZE = 4
+
+    def tearDown(self):
+        del settings.DYNAMICRESPONSE_PARALLEL_CHUNK_SIZE
+
+    def testPkRangesCoverQueryset(self):
+        posts = BlogPost.objects.all()
+        ranges = list(parallel.pk_ranges(posts, 10))
+        lo = posts.order_by('pk')[0].pk
+
+        self.assertEqual(ranges, [(lo, lo + 10), (lo + 10, lo + 20), (lo + 20, lo + 30)])
+
+    def testNDJSONMatchesSequentialExport(self):
+        posts = BlogPost.objects.order_by('pk')
+        sequential = NDJSONResponse({ 'posts': posts }).content
+
+        self.assertEqual(NDJSONResponse({ 'posts': posts }, parallel=2).content, sequential)
+        self.assertEqual(len(sequential.splitlines()), 22)
+
+    def testCSVMatchesSequentialExport(self):
+        posts = BlogPost.objects.order_by('pk')
+        sequential = CSVResponse(posts).content
+
+        self.assertEqual(CSVResponse(posts, parallel=2).content, sequential)
+        self.assertEqual(len(sequential.splitlines()), 23)
+
+    def testEmptyQueryset(self):
+        self.assertEqual(NDJSONResponse(BlogPost.objects.none(), parallel=2).content, '')
+        self.assertEqual(CSVResponse(BlogPost.objects.none(), parallel=2).content, '')
+
+    def testOtherPayloadsAreSerializedSequentially(self):
+        emitter = NDJSONEmitter([1, 2], {}, None)
+        self.assertEqual(''.join(parallel.stream(emitter, processes=2)), '1\n2\n')
+
+
+class FileDatabaseExportTest(unittest.TestCase):
+    """
+    Workers open their own connections to databases that are not in memory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        connections.databases['export'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.directory, 'export.db'),
+        }
+        call_command('syncdb', database='export', interactive=False, verbosity=0)
+
+        for i in range(10):
+            BlogPost.objects.using('export').create(title='Post %d' % i, text='Text %d' % i)
+
+        settings.DYNAMICRESPONSE_PARALLEL_CHUNK_SIZE = 3
+
+    def tearDown(self):
+        del settings.DYNAMICRESPONSE_PARALLEL_CHUNK_SIZE
+
+        connections['export'].close()
+        del connections._connections['export']
+        del connections.databases['export']
+        shutil.rmtree(self.directory)
+
+    def testNDJSONMatchesSequentialExport(self):
+        posts = BlogPost.objects.using('export').order_by('pk')
+        sequential = NDJSONResponse({ 'posts': posts }).content
+
+        self.assertEqual(NDJSONResponse({ 'posts': posts }, parallel=2).content, sequential)
+        self.assertEqual(len(sequential.splitlines()), 10)
+
+        # The parent process can still use its connection
+        self.assertEqual(BlogPost.objects.using('export').count(), 10)
@@ -44,7 +44,7 @@ class DynamicResponseTest(unittest.TestCase):
         simple_form.errors[u'SimpleError'] = u'This was a very simple error, shame on you'
         simple_form.errors[u'Error2'] = u'This was a bit more serious'
 
-        should_equal = simplejson.dumps({'field_errors': simple_form.errors}, indent=0)
+        should_equal = simplejson.dumps({'field_errors': simple_form.errors})
 
         dynRes = DynamicResponse({}, extra={ 'form': simple_form }, status=CR_INVALID_DATA)
         serialized_result = dynRes.serialize()
@@ -165,3 +165,82 @@ class SerializeTest(unittest.TestCase):
 
         for header in self.ser.extra_headers:
             self.assertTrue(result.has_header(header), 'extra_headers has apparently not been merged with headers')
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [{ 'id': i, 'title': 'Post %d' % i } for i in range(50)]
+        self.accepts = ['application/json-patch+json', 'application/json']
+
+    def request(self, etag=None, accepts=None):
+        request = Mock()
+        request.path = '/posts/'
+        request.is_api = True
+        request.api_format = 'application/json'
+        request.api_format_params = {}
+        request.accepts = accepts or self.accepts
+        request.META = {}
+        if etag:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+        return request
+
+    def render(self, request):
+        return Serialize({ 'items': self.items }, patch=True).render_response(request, None)
+
+    def testResponseHasETag(self):
+        result = self.render(self.request())
+
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result.has_header('ETag'))
+        self.assertEqual(simplejson.loads(result.content)['items'], self.items)
+
+    def testUnchangedRepresentationReturnsNotModified(self):
+        etag = self.render(self.request())['ETag']
+        result = self.render(self.request(etag))
+
+        self.assertEqual(result.status_code, 304)
+        self.assertEqual(result['ETag'], etag)
+
+    def testChangedRepresentationReturnsPatch(self):
+        etag = self.render(self.request())['ETag']
+        self.items[3]['title'] = 'Changed'
+        self.items.append({ 'id': 50, 'title': 'New' })
+        result = self.render(self.request(etag))
+
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result['Content-Type'].startswith('application/json-patch+json'))
+        self.assertNotEqual(result['ETag'], etag)
+        self.assertEqual(simplejson.loads(result.content), [
+            { 'op': 'replace', 'path': '/items/3/title', 'value': 'Changed' },
+            { 'op': 'add', 'path': '/items/-', 'value': { 'id': 50, 'title': 'New' } },
+        ])
+
+    def testLargePatchReturnsFullResponse(self):
+        etag = self.render(self.request())['ETag']
+        self.items = [{ 'id': i, 'name': 'Other %d' % i } for i in range(50)]
+        result = self.render(self.request(etag))
+
+        self.assertTrue(result['Content-Type'].startswith('application/json;'))
+        self.assertEqual(simplejson.loads(result.content)['items'], self.items)
+
+    def testUnknownETagReturnsFullResponse(self):
+        result = self.render(self.request('"unknown"'))
+
+        self.assertTrue(result['Content-Type'].startswith('application/json;'))
+
+    def testPatchRequiresAcceptHeader(self):
+        etag = self.render(self.request())['ETag']
+        self.items[0]['title'] = 'Changed'
+        result = self.render(self.request(etag, accepts=['application/json']))
+
+        self.assertTrue(result['Content-Type'].startswith('application/json;'))
+
+    def testMakePatchEscapesPointers(self):
+        from dynamicresponse.jsonpatch import make_patch
+
+        self.assertEqual(make_patch({ 'a/b': 1, 'c~': [1, 2, 3] }, { 'a/b': 2, 'c~': [1] }), [
+            { 'op': 'replace', 'path': '/a~1b', 'value': 2 },
+            { 'op': 'remove', 'path': '/c~0/2' },
+            { 'op': 'remove', 'path': '/c~0/1' },
+        ])
@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.db import router
+from django.http import HttpRequest
+from django.test import TestCase
+from django.utils import simplejson
+
+from dynamicresponse import routers
+
+from blog.models import BlogPost
+
+
+class ReplicaRouterTest(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        self.routers = router.routers
+        router.routers = [routers.ReplicaRouter()]
+        settings.DYNAMICRESPONSE_READ_REPLICA = 'replica'
+
+        BlogPost.objects.create(title='Primary', text='Text')
+        BlogPost.objects.using('replica').create(title='Replica', text='Text')
+
+    def tearDown(self):
+        router.routers = self.routers
+        routers.use_replica(False)
+        del settings.DYNAMICRESPONSE_READ_REPLICA
+
+    def titles(self, response):
+        return [post['title'] for post in simplejson.loads(response.content)['posts']]
+
+    def testApiReadsUseReplica(self):
+        response = self.client.get('/', HTTP_ACCEPT='application/json')
+        self.assertEqual(self.titles(response), ['Replica'])
+
+    def testStreamedApiReadsUseReplica(self):
+        response = self.client.get('/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(routers.get_replica(), None)
+
+        titles = [simplejson.loads(line)['title'] for line in response.content.splitlines()]
+        self.assertEqual(titles, ['Replica'])
+        self.assertEqual(routers.get_replica(), None)
+
+    def testObjectsReadDuringApiGetAreSavedToPrimary(self):
+        request = HttpRequest()
+        request.method = 'GET'
+        routers.route_request(request)
+        self.assertEqual(routers.get_replica(), 'replica')
+
+        post = BlogPost.objects.get(title='Replica')
+        post.title = 'Edited'
+        post.save()
+        routers.use_replica(False)
+
+        self.assertEqual(post._state.db, 'default')
+        self.assertTrue(BlogPost.objects.using('default').filter(title='Edited').exists())
+        self.assertFalse(BlogPost.objects.using('replica').filter(title='Edited').exists())
+
+    def testOtherReadsUsePrimary(self):
+        response = self.client.get('/')
+        self.assertEqual([post.title for post in response.context['posts']], ['Primary'])
+
+    def testRoutingIsResetAfterRequest(self):
+        self.client.get('/', HTTP_ACCEPT='application/json')
+        self.assertEqual(routers.get_replica(), None)
+        self.assertEqual([post.title for post in BlogPost.objects.all()], ['Primary'])
+
+    def testWritesUsePrimaryAndReadsFollowThem(self):
+        data = simplejson.dumps({ 'title': 'Created', 'text': 'Text' })
+        response = self.client.post('/create/', data, content_type='application/json', HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BlogPost.objects.using('default').filter(title='Created').exists())
+        self.assertFalse(BlogPost.objects.using('replica').filter(title='Created').exists())
+        self.assertTrue(response.has_header('X-Last-Write'))
+
+        # The cookie routes the client's reads to the primary
+        response = self.client.get('/', HTTP_ACCEPT='application/json')
+        self.assertEqual(self.titles(response), ['Primary', 'Created'])
+
+    def testLastWriteHeader(self):
+        response = self.client.get('/', HTTP_ACCEPT='application/json', HTTP_X_LAST_WRITE=str(time.time()))
+        self.assertEqual(self.titles(response), ['Primary'])
+
+    def testExpiredWindowUsesReplica(self):
+        settings.DYNAMICRESPONSE_READ_YOUR_WRITES = 5
+        try:
+            response = self.client.get('/', HTTP_ACCEPT='application/json', HTTP_X_LAST_WRITE=str(time.time() - 10))
+        finally:
+            del settings.DYNAMICRESPONSE_READ_YOUR_WRITES
+
+        self.assertEqual(self.titles(response), ['Replica'])
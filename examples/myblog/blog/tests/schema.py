@@ -0,0 +1,125 @@
+import unittest
+
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.test import TestCase
+from django.utils import simplejson
+
+from dynamicresponse import schema
+from dynamicresponse.json_response import JsonResponse
+
+
+class ModelWithOwner(models.Model):
+    title = models.CharField('Title', max_length=200)
+    text = models.TextField('Text')
+    owner = models.ForeignKey(User, related_name='+')
+    secret = 'should never be serialized'
+
+    def serialize_fields(self):
+        return [
+            'id',
+            'secret'
+        ]
+
+    def shout(self):
+        return self.title.upper()
+
+
+class OwnerSchema(schema.Schema):
+    model = User
+    fields = ('username',)
+
+
+class ModelWithOwnerSchema(schema.Schema):
+    model = ModelWithOwner
+    fields = ('id', 'title', 'owner', 'shout')
+    rename = { 'title': 'name' }
+    computed = ('length',)
+    nested = { 'owner': OwnerSchema }
+
+    def length(self, obj):
+        return len(obj.text)
+
+
+class UserGroupsSchema(schema.Schema):
+    model = User
+    fields = ('username', 'groups')
+
+
+class SchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        schema.register(ModelWithOwnerSchema)
+
+        self.obj = ModelWithOwner(id=3, title='Hadouken', text='Street Fighter',
+                                  owner=User(id=1, username='johndoe', password='secret'))
+
+    def tearDown(self):
+        schema.unregister(ModelWithOwner)
+
+    def testRegisteredSchemaIsUsedInPlaceOfModelFields(self):
+        result = simplejson.loads(JsonResponse(self.obj).content)
+
+        self.assertEqual(result, {
+            'id': 3,
+            'name': 'Hadouken',
+            'owner': { 'username': 'johndoe' },
+            'shout': 'HADOUKEN',
+            'length': 14,
+        })
+
+    def testUnregisteredModelFallsBackToSerializeFields(self):
+        schema.unregister(ModelWithOwner)
+        result = simplejson.loads(JsonResponse(self.obj).content)
+
+        self.assertEqual(result, { 'id': 3, 'secret': 'should never be serialized' })
+
+    def testSchemaIsCompiledOnce(self):
+        self.assertTrue(schema.compile_schema(ModelWithOwnerSchema) is schema.registry.get(ModelWithOwner))
+
+    def testInvalidSchemasAreRejectedOnRegistration(self):
+
+        class UnknownField(schema.Schema):
+            model = ModelWithOwner
+            fields = ('id', 'does_not_exist')
+
+        class UnknownRename(schema.Schema):
+            model = ModelWithOwner
+            fields = ('id',)
+            rename = { 'title': 'name' }
+
+        class MissingComputed(schema.Schema):
+            model = ModelWithOwner
+            computed = ('length',)
+
+        class ClashingKeys(schema.Schema):
+            model = ModelWithOwner
+            fields = ('id', 'title')
+            rename = { 'title': 'id' }
+
+        class NoModel(schema.Schema):
+            fields = ('id',)
+
+        for schema_class in (UnknownField, UnknownRename, MissingComputed, ClashingKeys, NoModel):
+            self.assertRaises(ImproperlyConfigured, schema.register, schema_class)
+
+
+class ManyToManySchemaTest(TestCase):
+
+    def setUp(self):
+        schema.register(UserGroupsSchema)
+
+    def tearDown(self):
+        schema.unregister(User)
+
+    def testManyToManyFieldWithoutNestedSchemaIsSerialized(self):
+        user = User.objects.create_user('johndoe', 'john@example.com', 'secret')
+        group = Group.objects.create(name='Editors')
+        user.groups.add(group)
+
+        result = simplejson.loads(JsonResponse(user).content)
+
+        self.assertEqual(result['username'], 'johndoe')
+        self.assertEqual(len(result['groups']), 1)
+        self.assertEqual(result['groups'][0]['name'], 'Editors')
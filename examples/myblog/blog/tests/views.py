@@ -139,6 +139,32 @@ class ViewJSONTests(TestCase):
         self.assertTrue('posts' in data)
         self.assertEquals(data['posts'][0]['id'], 1)
 
+    def testListPostsAsColumns(self):
+        """
+        Test the list_posts view, with columnar output.
+        """
+
+        response = self.client.get(reverse('list_posts'), HTTP_ACCEPT='application/json; layout=columns')
+        self.assertEquals(response.status_code, 200)
+
+        data = simplejson.loads(response.content)
+        self.assertEquals(data['posts']['columns'], ['id', 'title', 'text'])
+        self.assertEquals(data['posts']['rows'][0][0], 1)
+
+    def testListPostsAsNDJSON(self):
+        """
+        Test the list_posts view, streaming newline delimited JSON.
+        """
+
+        response = self.client.get(reverse('list_posts'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+
+        # Each line holds a single post
+        lines = response.content.splitlines()
+        self.assertEquals(len(lines), 1)
+        self.assertEquals(simplejson.loads(lines[0])['id'], 1)
+
     def testCreatePost(self):
         """
         Test the post view, creating a new entry.
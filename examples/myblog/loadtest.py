@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+"""
+Load test harness for the example blog.
+
+Seeds a fresh SQLite database with blog posts, serves the project with a
+threaded WSGI server, and drives a mix of API requests against it:
+
+ - `list`: JSON list of all posts
+ - `detail`: JSON detail of a random post
+ - `create`: JSON POST creating a post (decoded by DynamicFormatMiddleware)
+ - `auth`: JSON list with Basic authentication
+
+Reports the throughput and the 50th, 95th and 99th percentile latencies.
+The traffic is generated from a fixed seed, so runs with the same options
+are comparable between commits:
+
+    python examples/myblog/loadtest.py --posts 1000 --requests 5000 --concurrency 8
+"""
+
+import base64
+import httplib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import Queue
+from optparse import OptionParser
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'myblog.settings'
+
+from django.conf import settings
+from django.utils import simplejson
+
+USERNAME = 'loadtest'
+PASSWORD = 'loadtest'
+
+# Relative weights of the request kinds
+MIX = (
+    ('list', 3),
+    ('detail', 4),
+    ('create', 1.5),
+    ('auth', 1.5),
+)
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+def setup_database(path, posts):
+    """
+    Creates the database and seeds it with the test user and posts.
+    """
+
+    settings.DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
+    settings.DATABASES['default']['NAME'] = path
+    settings.DEBUG = False
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import transaction
+
+    from blog.models import BlogPost
+
+    call_command('syncdb', interactive=False, verbosity=0)
+    User.objects.create_user(USERNAME, 'loadtest@example.com', PASSWORD)
+
+    transaction.enter_transaction_management()
+    transaction.managed(True)
+    try:
+        for i in xrange(posts):
+            BlogPost.objects.create(title='Post %d' % i, text='Lorem ipsum dolor sit amet. ' * 20)
+        transaction.commit()
+    finally:
+        transaction.leave_transaction_management()
+
+    return list(BlogPost.objects.values_list('id', flat=True))
+
+def start_server():
+    """
+    Serves the project in a background thread, returning the server.
+    """
+
+    from django.core.handlers.wsgi import WSGIHandler
+
+    server = make_server('127.0.0.1', 0, WSGIHandler(), ThreadingWSGIServer, QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server
+
+def plan(count, ids, seed):
+    """
+    Returns the `(kind, method, path, body, headers)` requests to send.
+    """
+
+    rng = random.Random(seed)
+    total = sum([weight for kind, weight in MIX])
+    auth = 'Basic %s' % base64.b64encode('%s:%s' % (USERNAME, PASSWORD))
+    requests = []
+
+    for i in xrange(count):
+        pick = rng.random() * total
+        for kind, weight in MIX:
+            pick -= weight
+            if pick < 0:
+                break
+
+        headers = { 'Accept': 'application/json' }
+        body = None
+
+        if kind == 'list':
+            method, path = 'GET', '/'
+        elif kind == 'detail':
+            method, path = 'GET', '/%d/' % rng.choice(ids)
+        elif kind == 'create':
+            method, path = 'POST', '/create/'
+            body = simplejson.dumps({ 'title': 'Created %d' % i, 'text': 'Text' })
+
+            # The CSRF token is taken from the cookie in the header
+            headers.update({ 'Content-Type': 'application/json', 'Cookie': 'csrftoken=loadtest', 'X-CSRFToken': 'loadtest' })
+        else:
+            method, path = 'GET', '/'
+            headers['Authorization'] = auth
+
+        requests.append((kind, method, path, body, headers))
+
+    return requests
+
+def send(port, request):
+    """
+    Sends a request, returning the status code and latency.
+    """
+
+    kind, method, path, body, headers = request
+    start = time.time()
+
+    connection = httplib.HTTPConnection('127.0.0.1', port)
+    try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except Exception:
+        status = None
+    finally:
+        connection.close()
+
+    return status, time.time() - start
+
+def run(port, requests, concurrency):
+    """
+    Sends the requests from `concurrency` threads, returning the
+    `(kind, status, latency)` results and the elapsed time.
+    """
+
+    queue = Queue.Queue()
+    for request in requests:
+        queue.put(request)
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                request = queue.get_nowait()
+            except Queue.Empty:
+                return
+
+            status, latency = send(port, request)
+            lock.acquire()
+            results.append((request[0], status, latency))
+            lock.release()
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results, time.time() - start
+
+def percentile(latencies, p):
+    """
+    Returns the percentile of sorted latencies (nearest rank).
+    """
+
+    if not latencies:
+        return 0.0
+
+    rank = max(int(round(p / 100.0 * len(latencies) + 0.5)) - 1, 0)
+    return latencies[min(rank, len(latencies) - 1)]
+
+def summarize(results, elapsed):
+    """
+    Returns the statistics for each kind of request, and in total.
+    """
+
+    kinds = [kind for kind, weight in MIX] + ['total']
+    summary = {}
+
+    for kind in kinds:
+        rows = [r for r in results if kind == 'total' or r[0] == kind]
+        latencies = sorted([latency for k, status, latency in rows])
+        summary[kind] = {
+            'requests': len(rows),
+            'errors': len([r for r in rows if r[1] is None or r[1] >= 400]),
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+        }
+
+    summary['total']['throughput'] = len(results) / elapsed
+    return summary
+
+def commit():
+    """
+    Returns the current git commit, if any.
+    """
+
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return process.communicate()[0].strip() or None
+    except OSError:
+        return None
+
+def report(summary, options):
+
+    print 'commit %s, %d posts, %d requests, concurrency %d' % (commit(), options.posts, options.requests, options.concurrency)
+    print
+    print '%-8s %9s %7s %9s %9s %9s' % ('', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms')
+    for kind in [kind for kind, weight in MIX] + ['total']:
+        stats = summary[kind]
+        print '%-8s %9d %7d %9.1f %9.1f %9.1f' % (kind, stats['requests'], stats['errors'], stats['p50'], stats['p95'], stats['p99'])
+    print
+    print 'throughput: %.1f requests/s' % summary['total']['throughput']
+
+def main():
+
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--posts', type='int', default=1000, help='number of blog posts to seed (default: 1000)')
+    parser.add_option('--requests', type='int', default=2000, help='number of requests to send (default: 2000)')
+    parser.add_option('--concurrency', type='int', default=8, help='number of concurrent clients (default: 8)')
+    parser.add_option('--warmup', type='int', default=50, help='requests to send before measuring (default: 50)')
+    parser.add_option('--seed', type='int', default=0, help='seed for the request mix (default: 0)')
+    parser.add_option('--json', action='store_true', help='print the results as JSON')
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        ids = setup_database(os.path.join(directory, 'loadtest.db'), options.posts)
+        server = start_server()
+        port = server.server_port
+
+        run(port, plan(options.warmup, ids, options.seed + 1), options.concurrency)
+        results, elapsed = run(port, plan(options.requests, ids, options.seed), options.concurrency)
+        server.shutdown()
+
+        summary = summarize(results, elapsed)
+        if options.json:
+            print simplejson.dumps({ 'commit': commit(), 'options': options.__dict__, 'results': summary }, indent=4)
+        else:
+            report(summary, options)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Memory profile of request decoding and response encoding.
+
+Measures the peak and retained memory of:
+
+ - `decode`: `DynamicFormatMiddleware.process_request` on a JSON body
+ - `json`: `JsonResponse` on a queryset
+ - `ndjson`: consuming a streamed `NDJSONResponse` on a queryset
+ - `csv`: consuming a streamed `CSVResponse` on a queryset
+
+for increasing numbers of rows, and plots the peak memory against the
+number of rows. Fails when the peak grows by more than
+`--max-bytes-per-row` per additional row (or `--max-streaming-bytes-per-row`
+for the streamed responses):
+
+    python examples/myblog/memprofile.py --sizes 1000,2000,4000,8000
+
+Allocations are traced with `tracemalloc` when available. Otherwise (as
+on Python 2) each measurement runs in a forked process, and the growth
+of its resident set is read from `/proc` (Linux only).
+"""
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+from optparse import OptionParser
+
+import loadtest
+
+from django.utils import simplejson
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+WORKLOADS = ('decode', 'json', 'ndjson', 'csv')
+STREAMING = ('ndjson', 'csv')
+
+def workload(name, rows):
+    """
+    Returns a function running the workload for the number of rows.
+    Inputs are prepared up front, so they are not measured.
+    """
+
+    from django.http import HttpRequest
+
+    from dynamicresponse.csv_response import CSVResponse
+    from dynamicresponse.json_response import JsonResponse
+    from dynamicresponse.middleware.dynamicformat import DynamicFormatMiddleware
+    from dynamicresponse.ndjson_response import NDJSONResponse
+
+    from blog.models import BlogPost
+
+    if name == 'decode':
+        body = simplejson.dumps({
+            'title': 'Title',
+            'posts': [{ 'id': i, 'title': 'Post %d' % i, 'text': 'Lorem ipsum dolor sit amet.' } for i in xrange(rows)],
+        })
+
+        def run():
+            request = HttpRequest()
+            request.method = 'POST'
+            request.META = { 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': len(body) }
+            request._raw_post_data = body
+            DynamicFormatMiddleware().process_request(request)
+
+        return run
+
+    queryset = BlogPost.objects.order_by('pk')[:rows]
+    response_class = { 'json': JsonResponse, 'ndjson': NDJSONResponse, 'csv': CSVResponse }[name]
+
+    def run():
+        for chunk in response_class({ 'posts': queryset }):
+            pass
+
+    return run
+
+def _status(field):
+
+    for line in open('/proc/self/status'):
+        if line.startswith(field + ':'):
+            return int(line.split()[1]) * 1024
+
+def measure(run):
+    """
+    Returns the peak and retained memory of running the function, in bytes.
+    """
+
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            run()
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return peak - start, current - start
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            gc.collect()
+
+            # Reset the peak resident set size
+            open('/proc/self/clear_refs', 'w').write('5')
+            start = _status('VmRSS')
+            run()
+            gc.collect()
+            result = (_status('VmHWM') - start, _status('VmRSS') - start)
+            os.write(write, simplejson.dumps(result))
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    result = os.read(read, 1024)
+    os.close(read)
+    os.waitpid(pid, 0)
+
+    if not result:
+        raise RuntimeError('Measuring failed; tracemalloc or Linux /proc is required')
+
+    return tuple(simplejson.loads(result))
+
+def plot(results, sizes, width=50):
+    """
+    Returns a bar chart of the peak memory for each workload and size.
+    """
+
+    largest = max([peak for peak, retained in results.values()]) or 1
+    lines = []
+    for name in WORKLOADS:
+        lines.append(name)
+        for size in sizes:
+            peak = results[(name, size)][0]
+            lines.append('  %8d rows |%-*s %8.1f KB' % (size, width, '#' * int(round(width * float(peak) / largest)), peak / 1024.0))
+
+    return '\n'.join(lines)
+
+def main():
+
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--sizes', default='1000,2000,4000,8000', help='comma separated numbers of rows (default: 1000,2000,4000,8000)')
+    parser.add_option('--max-bytes-per-row', type='int', default=16384, help='maximum growth of the peak per row (default: 16384)')
+    parser.add_option('--max-streaming-bytes-per-row', type='int', default=4096, help='maximum growth of the peak per row for streamed responses (default: 4096)')
+    parser.add_option('--json', action='store_true', help='print the results as JSON')
+    options, args = parser.parse_args()
+
+    sizes = sorted([int(size) for size in options.sizes.split(',')])
+    directory = tempfile.mkdtemp()
+    try:
+        loadtest.setup_database(os.path.join(directory, 'memprofile.db'), sizes[-1])
+
+        results = {}
+        for name in WORKLOADS:
+            for size in sizes:
+                results[(name, size)] = measure(workload(name, size))
+    finally:
+        shutil.rmtree(directory)
+
+    # Growth of the peak per row, between the smallest and largest sizes
+    growth = {}
+    for name in WORKLOADS:
+        growth[name] = float(results[(name, sizes[-1])][0] - results[(name, sizes[0])][0]) / max(sizes[-1] - sizes[0], 1)
+
+    if options.json:
+        print simplejson.dumps({
+            'commit': loadtest.commit(),
+            'results': dict([('%s:%d' % key, { 'peak': peak, 'retained': retained }) for key, (peak, retained) in results.items()]),
+            'bytes_per_row': growth,
+        }, indent=4)
+    else:
+        print 'commit %s, measured with %s' % (loadtest.commit(), tracemalloc and 'tracemalloc' or 'resident set size')
+        print
+        print '%-8s %8s %12s %12s' % ('', 'rows', 'peak KB', 'retained KB')
+        for name in WORKLOADS:
+            for size in sizes:
+                peak, retained = results[(name, size)]
+                print '%-8s %8d %12.1f %12.1f' % (name, size, peak / 1024.0, retained / 1024.0)
+        print
+        print plot(results, sizes)
+        print
+        for name in WORKLOADS:
+            print '%-8s %8.1f bytes/row' % (name, growth[name])
+
+    failed = False
+    for name in WORKLOADS:
+        limit = name in STREAMING and options.max_streaming_bytes_per_row or options.max_bytes_per_row
+        if growth[name] > limit:
+            print >> sys.stderr, 'Peak memory of %s grows by %.1f bytes per row, more than %d' % (name, growth[name], limit)
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
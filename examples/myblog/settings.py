@@ -19,7 +19,13 @@ DATABASES = {
         'PASSWORD': '',                  # Not used with sqlite3.
         'HOST': '',                      # Set to empty string for localhost. Not used with sqlite3.
         'PORT': '',                      # Set to empty string for default. Not used with sqlite3.
-    }
+    },
+
+    # Read replica for the replica routing tests
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'myblog-replica.db',
+    },
 }
 
 # Local time zone for this installation. Choices can be found here:
@@ -93,5 +99,6 @@ INSTALLED_APPS = (
     'django.contrib.sessions',
     'django.contrib.sites',
     'django.contrib.messages',
+    'dynamicresponse',
     'myblog.blog',
 )